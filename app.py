@@ -4,7 +4,13 @@ import asyncio
 import httpx
 import sys
 import json
+import uuid
 from auditor_engine import RedHatAuditor
+from audit_store import AuditJobStore
+from parser import guides_signature
+from vector_index import VectorIndexManager, VECTOR_DB_DIR
+from audit_scheduler import get_scheduler, PRIORITY_INTERACTIVE, PRIORITY_BATCH, SchedulerFull
+from style_server import get_style_server
 
 # --- 1. UI Configuration & Branding ---
 st.set_page_config(
@@ -15,6 +21,7 @@ st.set_page_config(
 
 OLLAMA_BASE_URL = os.getenv("OLLAMA_HOST", "http://localhost:11434").rstrip('/')
 HIDDEN_GUIDES_FILE = ".hidden_guides.json"
+TRACE_DIR = ".audit_traces"
 
 # Helper functions for persistent hidden guides
 def save_hidden_guides(hidden_set):
@@ -128,6 +135,27 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
+# Shared checkpoint store for audit jobs
+job_store = AuditJobStore()
+
+# Process-wide scheduler: all sessions share one queue in front of Ollama
+scheduler = get_scheduler()
+
+# Process-wide MCP style server: concurrent audits share its query batcher
+style_server = get_style_server()
+
+def load_job_into_review(job):
+    """Load a checkpointed job's reports into the review UI."""
+    reports = job_store.load_reports(job['job_id'])
+    results = [reports[i] for i in sorted(reports)]
+    st.session_state.audit_results = results
+    st.session_state.metrics = RedHatAuditor.calculate_metrics(results)
+    st.session_state.edits = {}
+    st.session_state.show_document = False
+    st.session_state.original_filename = job['doc_name']
+    st.session_state.job_id = job['job_id']
+    st.session_state.routing_stats = job_store.get_job_stats(job['job_id'])
+
 # --- 2. Session State Initialization ---
 # This prevents the AttributeError: st.session_state has no attribute "audit_results"
 if 'audit_results' not in st.session_state:
@@ -144,6 +172,16 @@ if 'confirm_clear_guides' not in st.session_state:
     st.session_state.confirm_clear_guides = False
 if 'hidden_guides' not in st.session_state:
     st.session_state.hidden_guides = load_hidden_guides()
+if 'job_id' not in st.session_state:
+    st.session_state.job_id = None
+if 'routing_stats' not in st.session_state:
+    st.session_state.routing_stats = None
+if 'user_id' not in st.session_state:
+    st.session_state.user_id = uuid.uuid4().hex
+if 'trace_path' not in st.session_state:
+    st.session_state.trace_path = None
+if 'profile_path' not in st.session_state:
+    st.session_state.profile_path = None
 
 # --- 3. Sidebar: Settings & Knowledge Base ---
 with st.sidebar:
@@ -170,10 +208,54 @@ with st.sidebar:
             index=default_index,
             help="💡 Recommended: llama3.1:8b or qwen2.5:7b for best tool-calling performance"
         )
+
+        # Optional small model that skips clean chunks before the full audit
+        triage_choice = st.selectbox(
+            "Triage Model",
+            options=["None"] + models,
+            help="💡 A small 1-3B model (e.g. llama3.2:1b) pre-screens chunks; only likely violations go to the main model"
+        )
+        triage_model = None if triage_choice == "None" else triage_choice
     except:
         selected_model = "llama3.1:8b"
+        triage_model = None
         st.error("Ollama Offline")
 
+    # Boilerplate (disclaimers, legal notices, blurbs) is audited once and reused
+    dedup_enabled = st.checkbox("Reuse audits of duplicate paragraphs", value=True)
+    dedup_threshold = st.slider(
+        "Duplicate similarity threshold",
+        min_value=0.80,
+        max_value=1.00,
+        value=0.90,
+        step=0.01,
+        disabled=not dedup_enabled,
+        help="1.00 only reuses audits of identical paragraphs"
+    )
+
+    # Batch audits yield to interactive ones in the shared Ollama queue
+    batch_priority = st.checkbox(
+        "Low priority (batch) audit",
+        value=False,
+        help="Interactive audits are served first when several people share this Ollama instance"
+    )
+    queue = scheduler.snapshot()
+    st.caption(f"Ollama queue: {queue['running']}/{queue['max_concurrency']} running, {queue['waiting']} waiting")
+
+    # Opt-in profiling: timeline of agent turns, tool calls, embeddings and search
+    trace_enabled = st.checkbox(
+        "Profile audit (timeline trace)",
+        value=False,
+        help="Writes a Chrome trace / Perfetto JSON file per audit (open it at ui.perfetto.dev)"
+    )
+    profile_enabled = st.checkbox("Include sampling profile", value=False, disabled=not trace_enabled)
+    if st.session_state.trace_path and os.path.exists(st.session_state.trace_path):
+        with open(st.session_state.trace_path, "rb") as f:
+            st.download_button("Download Trace", data=f.read(), file_name="audit_trace.json", use_container_width=True)
+    if st.session_state.profile_path and os.path.exists(st.session_state.profile_path):
+        with open(st.session_state.profile_path, "rb") as f:
+            st.download_button("Download Profile", data=f.read(), file_name="audit_profile.txt", use_container_width=True)
+
     st.divider()
     
     # RAG Guide Manager
@@ -191,11 +273,47 @@ with st.sidebar:
             f.write(uploaded_guide.getbuffer())
         st.rerun()
 
+    # Guides are indexed once; unchecking one hides it at search time
+    # (no re-embedding), keyed by file name as the stable guide ID
     st.caption("Active Guides:")
     supported_exts = ('.md', '.pdf', '.docx', '.html', '.htm', '.txt')
-    for g in os.listdir("guides"):
+    for g in sorted(os.listdir("guides")):
         if g.lower().endswith(supported_exts):
-            st.text(f"• {g}")
+            visible = st.checkbox(g, value=g not in st.session_state.hidden_guides, key=f"guide_{g}")
+            if visible == (g in st.session_state.hidden_guides):
+                if visible:
+                    st.session_state.hidden_guides.discard(g)
+                else:
+                    st.session_state.hidden_guides.add(g)
+                save_hidden_guides(st.session_state.hidden_guides)
+
+    # Vector index statistics and maintenance (stats/compaction don't need embeddings)
+    index_manager = VectorIndexManager(VECTOR_DB_DIR, embeddings=None)
+    index_stats = index_manager.stats()
+    if index_stats['generation']:
+        st.caption(
+            f"Index: {index_stats['chunk_count']} chunks · "
+            f"{index_stats['index_bytes'] / 1e6:.1f} MB "
+            f"({index_stats['total_bytes'] / 1e6:.1f} MB on disk, {index_stats['generations']} generation(s))"
+        )
+        if st.button("Compact Index", use_container_width=True):
+            removed = index_manager.compact()
+            st.toast(f"Removed {len(removed)} stale index entries")
+            st.rerun()
+
+    st.divider()
+
+    # Finished audits reload from checkpoints without touching the model
+    st.subheader("Audit History")
+    finished_jobs = job_store.list_jobs(status="completed")
+    if finished_jobs:
+        job_labels = {f"{j['doc_name']} ({j['model_name']}, {j['job_id'][:8]})": j for j in finished_jobs}
+        selected_job = st.selectbox("Completed Audits", options=list(job_labels.keys()))
+        if st.button("Load Audit", use_container_width=True):
+            load_job_into_review(job_labels[selected_job])
+            st.rerun()
+    else:
+        st.caption("No completed audits yet.")
 
 # --- 4. Main Application Header ---
 st.title("WIPEA (W.I.P Editorial Auditor)")
@@ -208,7 +326,26 @@ if uploaded_file:
     with open(temp_path, "wb") as f:
         f.write(uploaded_file.getbuffer())
 
-    if st.button("Run Audit", type="primary", use_container_width=True):
+    job_id = AuditJobStore.make_job_id(temp_path, selected_model)
+    job = job_store.get_job(job_id)
+    if job and job['status'] == "completed":
+        run_label = "Load Previous Audit"
+    elif job:
+        run_label = f"Resume Audit ({len(job_store.load_reports(job_id))}/{job['total_chunks']} chunks done)"
+    else:
+        run_label = "Run Audit"
+
+    # Completed jobs load from checkpoints; offer a fresh run as well, e.g.
+    # after guides or dedup/triage settings changed
+    rerun = False
+    if job and job['status'] == "completed":
+        load_col, rerun_col = st.columns(2)
+        start_audit = load_col.button(run_label, type="primary", use_container_width=True)
+        rerun = rerun_col.button("Re-run Audit", use_container_width=True)
+    else:
+        start_audit = st.button(run_label, type="primary", use_container_width=True)
+
+    if start_audit or rerun:
         # UI Elements for dynamic loading updates
         status_placeholder = st.empty()
         
@@ -216,11 +353,43 @@ if uploaded_file:
         async def update_ui_status(text):
             status_placeholder.markdown(f"<p class='status-text'>{text}</p>", unsafe_allow_html=True)
 
-        auditor = RedHatAuditor(model_name=selected_model, base_url=OLLAMA_BASE_URL)
+        # Traced audits spawn a private server so its spans land in the trace
+        server_url = None
+        if not trace_enabled and (rerun or not job or job['status'] != "completed"):
+            try:
+                with st.spinner("Starting the style guide server..."):
+                    server_url = style_server.ensure_started()
+            except RuntimeError as e:
+                st.warning(f"{e}. Using a private server for this audit.")
+
+        auditor = RedHatAuditor(
+            model_name=selected_model,
+            base_url=OLLAMA_BASE_URL,
+            store=job_store,
+            dedup_threshold=dedup_threshold if dedup_enabled else None,
+            triage_model=triage_model,
+            scheduler=scheduler,
+            user_id=st.session_state.user_id,
+            priority=PRIORITY_BATCH if batch_priority else PRIORITY_INTERACTIVE,
+            trace_dir=TRACE_DIR if trace_enabled else None,
+            profile=trace_enabled and profile_enabled,
+            guides_version=guides_signature("guides", st.session_state.hidden_guides),
+            server_url=server_url
+        )
 
         async def perform_audit():
             # Agent now uses lazy initialization - no need to call initialize_tools explicitly
-            return await auditor.run_audit(temp_path, status_callback=update_ui_status)
+            try:
+                return await auditor.run_audit(
+                    temp_path,
+                    status_callback=update_ui_status,
+                    job_id=job_id,
+                    doc_name=uploaded_file.name,
+                    rerun=rerun
+                )
+            finally:
+                # Close the MCP session inside the same event loop that opened it
+                await auditor.close()
         
         try:
             results = asyncio.run(perform_audit())
@@ -229,8 +398,15 @@ if uploaded_file:
             st.session_state.edits = {} # Reset edits for new run
             st.session_state.show_document = False # Reset document viewer
             st.session_state.original_filename = uploaded_file.name # Store original filename
+            st.session_state.job_id = job_id
+            st.session_state.routing_stats = job_store.get_job_stats(job_id)
+            st.session_state.trace_path = auditor.last_trace_path
+            st.session_state.profile_path = auditor.last_profile_path
             status_placeholder.empty()
             st.rerun()
+        except SchedulerFull as e:
+            status_placeholder.empty()
+            st.warning(f"{e}. Progress so far is saved - run the audit again to resume.")
         except Exception as e:
             st.error(f"Audit failed: {e}")
 
@@ -244,6 +420,15 @@ if st.session_state.audit_results:
     for i, (label, val) in enumerate(m.items()):
         m_cols[i].metric(label, f"{val}%")
 
+    # Triage routing summary (only recorded when a triage model was used)
+    r = st.session_state.routing_stats
+    if r and r.get('triaged'):
+        st.caption(
+            f"Triage: {r['skipped']} of {r['triaged']} chunks skipped ({r['skip_rate']:.0%}), "
+            f"{r['escalated']} sent to the full auditor · "
+            f"triage {r['triage_seconds']:.1f}s, audit {r['audit_seconds']:.1f}s"
+        )
+
     st.divider()
     
     # Bulk Action Header
@@ -338,6 +523,6 @@ if st.session_state.audit_results:
         st.markdown("<div class='page-container'>{}</div>".format(full_text.replace('\n', '<br>')), unsafe_allow_html=True)
 
     # Local cleanup
-    if os.path.exists(temp_path):
+    if uploaded_file and os.path.exists(temp_path):
         os.remove(temp_path)
 
@@ -0,0 +1,132 @@
+import os
+import asyncio
+import itertools
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+
+# Matches Ollama's own setting for parallel requests per model
+OLLAMA_NUM_PARALLEL = int(os.getenv("OLLAMA_NUM_PARALLEL", "1"))
+AUDIT_MAX_QUEUE = int(os.getenv("AUDIT_MAX_QUEUE", "32"))
+
+class SchedulerFull(Exception):
+    """Raised when the wait queue is full (backpressure)."""
+
+class AuditScheduler:
+    """
+    Process-wide gate in front of Ollama.
+
+    Every model request from every Streamlit session acquires a slot first.
+    At most `max_concurrency` requests run at once. Waiting requests are
+    served by priority (interactive before batch), then by fairness (the user
+    with the fewest running requests, then the one served least recently),
+    then first come, first served. Streamlit runs each session in its own
+    thread and event loop, so the state is guarded by a threading lock and
+    waiters poll instead of sharing an asyncio primitive.
+    """
+
+    def __init__(self, max_concurrency: int = OLLAMA_NUM_PARALLEL, max_queue: int = AUDIT_MAX_QUEUE):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._waiting = {}
+        self._running = 0
+        self._running_by_user = defaultdict(int)
+        # Users never served sort before everyone (seq starts at 0)
+        self._last_served = defaultdict(lambda: -1)
+        self.stats = {"granted": 0, "rejected": 0, "max_waiting": 0}
+
+    def _order(self):
+        """Waiting tickets in the order they will be served."""
+        return sorted(
+            self._waiting.values(),
+            key=lambda t: (
+                t["priority"],
+                self._running_by_user[t["user_id"]],
+                self._last_served[t["user_id"]],
+                t["seq"]
+            )
+        )
+
+    def _enqueue(self, user_id: str, priority: int) -> Dict:
+        with self._lock:
+            if len(self._waiting) >= self.max_queue:
+                self.stats["rejected"] += 1
+                raise SchedulerFull(f"Ollama queue is full ({self.max_queue} requests waiting)")
+            ticket = {"seq": next(self._seq), "user_id": user_id, "priority": priority}
+            self._waiting[ticket["seq"]] = ticket
+            self.stats["max_waiting"] = max(self.stats["max_waiting"], len(self._waiting))
+            return ticket
+
+    def _try_grant(self, ticket: Dict) -> bool:
+        with self._lock:
+            if self._running >= self.max_concurrency or self._order()[0] is not ticket:
+                return False
+            del self._waiting[ticket["seq"]]
+            self._running += 1
+            self._running_by_user[ticket["user_id"]] += 1
+            self._last_served[ticket["user_id"]] = ticket["seq"]
+            self.stats["granted"] += 1
+            return True
+
+    def _release(self, ticket: Dict, granted: bool):
+        with self._lock:
+            if granted:
+                self._running -= 1
+                self._running_by_user[ticket["user_id"]] -= 1
+            else:
+                self._waiting.pop(ticket["seq"], None)
+
+    def position(self, ticket: Dict) -> Optional[int]:
+        """1-based queue position of a waiting ticket."""
+        with self._lock:
+            for index, waiting in enumerate(self._order()):
+                if waiting is ticket:
+                    return index + 1
+        return None
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "running": self._running,
+                "waiting": len(self._waiting),
+                "max_concurrency": self.max_concurrency,
+                **self.stats
+            }
+
+    @asynccontextmanager
+    async def slot(self, user_id: str, priority: int = PRIORITY_INTERACTIVE, on_wait=None, poll_interval: float = 0.25):
+        """
+        Hold one Ollama slot for the duration of the block. `on_wait` is
+        awaited with the queue position whenever it changes while waiting.
+        """
+        ticket = self._enqueue(user_id, priority)
+        granted = False
+        try:
+            last_position = None
+            while not self._try_grant(ticket):
+                position = self.position(ticket)
+                if on_wait and position != last_position:
+                    await on_wait(position)
+                last_position = position
+                await asyncio.sleep(poll_interval)
+            granted = True
+            yield
+        finally:
+            self._release(ticket, granted)
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler() -> AuditScheduler:
+    """Shared scheduler for all sessions in this process."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = AuditScheduler()
+        return _scheduler
@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from typing import Dict, List, Optional, Tuple
+from fingerprint import MIN_WORDS_FOR_NEAR_MATCH, word_count_range
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+AUDIT_DB_PATH = os.path.join(current_dir, ".audit_jobs.db")
+
+class AuditJobStore:
+    """
+    SQLite-backed checkpoint store for audit jobs.
+
+    Every finished chunk report is written as soon as it is produced, so an
+    interrupted audit can resume from the last checkpoint and only failed
+    chunks are retried.
+    """
+
+    def __init__(self, db_path: str = AUDIT_DB_PATH):
+        self.db_path = db_path
+        self._init_schema()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_schema(self):
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    doc_name TEXT,
+                    model_name TEXT,
+                    status TEXT,
+                    total_chunks INTEGER,
+                    created_at REAL,
+                    updated_at REAL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS chunk_reports (
+                    job_id TEXT,
+                    chunk_index INTEGER,
+                    status TEXT,
+                    report TEXT,
+                    error TEXT,
+                    updated_at REAL,
+                    PRIMARY KEY (job_id, chunk_index)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS job_stats (
+                    job_id TEXT PRIMARY KEY,
+                    stats TEXT
+                )
+            """)
+            # Reports of audited paragraphs by content fingerprint, shared across jobs.
+            # It is only a cache, so a table from an older layout is dropped.
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(fingerprint_reports)")}
+            if columns and "guides_version" not in columns:
+                conn.execute("DROP TABLE fingerprint_reports")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS fingerprint_reports (
+                    model_name TEXT,
+                    guides_version TEXT,
+                    chunk_type TEXT,
+                    exact_hash TEXT,
+                    words TEXT,
+                    word_count INTEGER,
+                    report TEXT,
+                    PRIMARY KEY (model_name, guides_version, chunk_type, exact_hash)
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS fingerprint_lengths ON fingerprint_reports (model_name, guides_version, chunk_type, word_count)"
+            )
+
+    @staticmethod
+    def make_job_id(doc_path: str, model_name: str) -> str:
+        """Derive a stable job ID from document content and model, so re-runs resume."""
+        digest = hashlib.md5()
+        with open(doc_path, "rb") as f:
+            for block in iter(lambda: f.read(65536), b""):
+                digest.update(block)
+        digest.update(model_name.encode())
+        return digest.hexdigest()[:16]
+
+    def create_job(self, job_id: str, doc_name: str, model_name: str, total_chunks: int):
+        """Register a job, keeping existing checkpoints if it was started before."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO jobs VALUES (?, ?, ?, 'running', ?, ?, ?)",
+                (job_id, doc_name, model_name, total_chunks, now, now)
+            )
+            conn.execute(
+                "UPDATE jobs SET status = 'running', total_chunks = ?, updated_at = ? WHERE job_id = ?",
+                (total_chunks, now, job_id)
+            )
+
+    def reset_job(self, job_id: str):
+        """Discard a job's checkpoints and stats so the next run audits from scratch."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM chunk_reports WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM job_stats WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list_jobs(self, status: Optional[str] = None) -> List[Dict]:
+        """Return jobs, most recently updated first."""
+        query = "SELECT * FROM jobs"
+        params = ()
+        if status:
+            query += " WHERE status = ?"
+            params = (status,)
+        with self._connect() as conn:
+            rows = conn.execute(query + " ORDER BY updated_at DESC", params).fetchall()
+        return [dict(row) for row in rows]
+
+    def set_status(self, job_id: str, status: str):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE job_id = ?",
+                (status, time.time(), job_id)
+            )
+
+    def save_chunk(self, job_id: str, chunk_index: int, report: Dict):
+        """Checkpoint a completed chunk report."""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO chunk_reports VALUES (?, ?, 'done', ?, NULL, ?)",
+                (job_id, chunk_index, json.dumps(report), time.time())
+            )
+
+    def save_chunk_failure(self, job_id: str, chunk_index: int, error: str):
+        """Record a failed chunk so the next run retries it."""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO chunk_reports VALUES (?, ?, 'failed', NULL, ?, ?)",
+                (job_id, chunk_index, error, time.time())
+            )
+
+    def load_reports(self, job_id: str) -> Dict[int, Dict]:
+        """Return checkpointed reports for a job keyed by chunk index."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT chunk_index, report FROM chunk_reports WHERE job_id = ? AND status = 'done'",
+                (job_id,)
+            ).fetchall()
+        return {row["chunk_index"]: json.loads(row["report"]) for row in rows}
+
+    def failed_chunks(self, job_id: str) -> List[int]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT chunk_index FROM chunk_reports WHERE job_id = ? AND status = 'failed'",
+                (job_id,)
+            ).fetchall()
+        return sorted(row["chunk_index"] for row in rows)
+
+    def save_job_stats(self, job_id: str, stats: Dict):
+        """Record per-job routing statistics (triage skip rate, timings)."""
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO job_stats VALUES (?, ?)", (job_id, json.dumps(stats)))
+
+    def get_job_stats(self, job_id: str) -> Optional[Dict]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT stats FROM job_stats WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row["stats"]) if row else None
+
+    def save_fingerprint_report(self, model_name: str, guides_version: str, chunk_type: str, fingerprint: Dict, report: Dict):
+        """
+        Remember a paragraph's report so identical boilerplate in other
+        documents audited against the same guides can reuse it.
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO fingerprint_reports VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (model_name, guides_version, chunk_type, fingerprint["exact"], " ".join(fingerprint["words"]),
+                 len(fingerprint["words"]), json.dumps(report))
+            )
+
+    def find_fingerprint_report(self, model_name: str, guides_version: str, chunk_type: str, fingerprint: Dict,
+                                fingerprinter) -> Optional[Tuple[Dict, float]]:
+        """
+        Look up a paragraph matching this fingerprint that was audited with the
+        same model and guides. Returns (report, similarity) or None.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT report FROM fingerprint_reports "
+                "WHERE model_name = ? AND guides_version = ? AND chunk_type = ? AND exact_hash = ?",
+                (model_name, guides_version, chunk_type, fingerprint["exact"])
+            ).fetchone()
+            if row:
+                return json.loads(row["report"]), 1.0
+            if fingerprinter.threshold >= 1.0 or not fingerprint["near_eligible"]:
+                return None
+            # Only paragraphs of a similar length can reach the threshold
+            min_words, max_words = word_count_range(len(fingerprint["words"]), fingerprinter.threshold)
+            rows = conn.execute(
+                "SELECT words, report FROM fingerprint_reports "
+                "WHERE model_name = ? AND guides_version = ? AND chunk_type = ? AND word_count BETWEEN ? AND ?",
+                (model_name, guides_version, chunk_type, max(min_words, MIN_WORDS_FOR_NEAR_MATCH), max_words)
+            ).fetchall()
+
+        candidates = [{"words": row["words"].split(), "near_eligible": True} for row in rows]
+        match = fingerprinter.best_near_match(fingerprint, candidates)
+        if match:
+            return json.loads(rows[match[0]]["report"]), match[1]
+        return None
@@ -1,14 +1,94 @@
+import os
 import json
 import asyncio
 import sys
 import re
+import time
 from parser import RedHatParser
+from audit_store import AuditJobStore
+from fingerprint import ChunkFingerprinter
+from audit_scheduler import PRIORITY_INTERACTIVE, SchedulerFull
+from tracing import Tracer, SamplingProfiler, AUDIT_TRACE_DIR_ENV, AUDIT_PROFILE_ENV, merge_traces, maybe_span
 from langchain_ollama import ChatOllama
 from langchain.agents import create_agent
+from langchain.agents.middleware import AgentMiddleware
+from contextlib import AsyncExitStack, asynccontextmanager
 from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_mcp_adapters.tools import load_mcp_tools
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Server settings read from the environment. The stdio client starts the
+# server with a minimal environment (HOME, PATH, ...), so these are forwarded.
+SERVER_ENV_VARS = (
+    "SEARCH_CHAR_BUDGET",
+    "SEARCH_BATCH_WINDOW_MS",
+    "SEARCH_MAX_BATCH",
+    "CHUNK_OVERLAP_TOKENS",
+    "HF_HOME"
+)
+
+# Synthetic trace lanes for spans reported by LangChain callbacks
+LLM_LANE = 1
+TOOL_LANE_BASE = 10
+
+class TraceCallbackHandler(BaseCallbackHandler):
+    """Records agent LLM turns and tool calls as trace spans."""
+
+    # Run in the event loop thread instead of an executor, so timings are exact
+    run_inline = True
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+        self.turn = 0
+        self.tool_lanes = {}
+        tracer.name_lane(LLM_LANE, "agent turns")
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self.turn += 1
+        self.tracer.begin(run_id, f"agent turn {self.turn}", "llm", tid=LLM_LANE)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self.tracer.end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self.tracer.end(run_id, error=str(error))
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        # Parallel tool calls each get their own lane so spans don't overlap
+        lane = TOOL_LANE_BASE
+        while lane in self.tool_lanes.values():
+            lane += 1
+        self.tool_lanes[run_id] = lane
+        self.tracer.name_lane(lane, f"tool calls {lane - TOOL_LANE_BASE + 1}")
+        self.tracer.begin(run_id, f"tool: {serialized.get('name', 'tool')}", "tool", tid=lane, input=str(input_str)[:200])
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self.tool_lanes.pop(run_id, None)
+        self.tracer.end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self.tool_lanes.pop(run_id, None)
+        self.tracer.end(run_id, error=str(error))
+
+class SchedulerSlotMiddleware(AgentMiddleware):
+    """
+    Holds a scheduler slot only while one agent model call runs, so Ollama
+    capacity isn't reserved during tool calls (MCP search, embedding).
+    """
+
+    def __init__(self, auditor):
+        super().__init__()
+        self.auditor = auditor
+
+    async def awrap_model_call(self, request, handler):
+        async with self.auditor._ollama_slot(self.auditor.status_callback):
+            return await handler(request)
 
 class RedHatAuditor:
-    def __init__(self, model_name="llama3.1:8b", base_url="http://localhost:11434"):
+    def __init__(self, model_name="llama3.1:8b", base_url="http://localhost:11434", store=None, dedup_threshold=0.9,
+                 triage_model=None, scheduler=None, user_id="default", priority=PRIORITY_INTERACTIVE,
+                 trace_dir=None, profile=False, guides_version=None, server_url=None):
+        self.model_name = model_name
         # Model configured for JSON mode to ensure schema reliability
         self.llm = ChatOllama(
             model=model_name,
@@ -33,11 +113,63 @@ class RedHatAuditor:
             "The 'proposed_text' should ONLY contain the rewritten [CURRENT] text, not the context."
         )
 
-        # Persistent agent/tools to avoid respawning MCP server on each audit
+        # Optional cheap triage tier: a small model decides whether a chunk
+        # needs the full tool-calling agent at all
+        self.triage_llm = None
+        if triage_model:
+            self.triage_llm = ChatOllama(
+                model=triage_model,
+                temperature=0,
+                format="json",
+                base_url=base_url
+            )
+
+        self.triage_prompt = (
+            "You are a fast pre-screener for the W.I.P Editorial Auditor. Decide whether the text below "
+            "likely violates W.I.P style rules: filler words (e.g. 'in order to'), corporate jargon, "
+            "passive voice, acronyms that are not spelled out, wordy or impersonal phrasing, or unclear sentences.\n"
+            "Output ONLY a JSON object: {'needs_audit': true or false}\n"
+            "Answer true if you are unsure.\n\n"
+            "Text:\n"
+        )
+        self.routing_stats = self._empty_routing_stats()
+
+        # Optional shared scheduler that gates every model request (triage
+        # calls and each agent model call; see SchedulerSlotMiddleware)
+        self.scheduler = scheduler
+        self.status_callback = None
+        self.user_id = user_id
+        self.priority = priority
+
+        # Opt-in profiling: timeline trace (Chrome/Perfetto JSON) across the
+        # auditor and the MCP subprocess, plus an optional sampling profile
+        self.trace_dir = trace_dir
+        self.profile = profile
+        self.trace_run_dir = None
+        self.tracer = None
+        self.last_trace_path = None
+        self.last_profile_path = None
+
+        # Persistent agent/tools to avoid respawning MCP server on each audit.
+        # With server_url, the auditor connects to a shared server over HTTP
+        # instead (traced runs still spawn their own, see initialize_tools).
+        self.server_url = server_url
         self.mcp_client = None
+        self.mcp_stack = None
         self.tools = None
         self.agent = None
 
+        # Checkpoint store for resumable audit jobs
+        self.store = store or AuditJobStore()
+        self.last_job_id = None
+
+        # Near-duplicate paragraphs are audited once (None disables, 1.0 = exact only)
+        self.fingerprinter = ChunkFingerprinter(dedup_threshold) if dedup_threshold else None
+        self.dedup_stats = {"audited": 0, "reused": 0}
+        # Reports are only shared across jobs audited against the same guides
+        # (see parser.guides_signature); without a version, only within a document
+        self.guides_version = guides_version
+
     async def get_agent(self):
         """Lazy initialization of agent - only spawn MCP server once."""
         if self.agent is None:
@@ -45,126 +177,444 @@ class RedHatAuditor:
         return self.agent
 
     async def initialize_tools(self):
-        """Spawns the MCP server as a subprocess and links tools."""
-        self.mcp_client = MultiServerMCPClient({
-            "style_guide": {
+        """Connects to the shared MCP server, or spawns one as a subprocess, and links tools."""
+        if self.server_url and not self.trace_run_dir:
+            connection = {"url": self.server_url, "transport": "streamable_http"}
+        else:
+            # Traced runs get a private server that writes its spans next to ours
+            connection = {
                 "command": sys.executable,
                 "args": ["redhat_style_server.py"],
                 "transport": "stdio"
             }
-        })
-        self.tools = await self.mcp_client.get_tools()
+            env = {name: os.environ[name] for name in SERVER_ENV_VARS if name in os.environ}
+            if self.trace_run_dir:
+                env[AUDIT_TRACE_DIR_ENV] = self.trace_run_dir
+                if self.profile:
+                    env[AUDIT_PROFILE_ENV] = "1"
+            if env:
+                connection["env"] = env
+        self.mcp_client = MultiServerMCPClient({"style_guide": connection})
+        # Hold one session open for the whole audit, so tool calls don't
+        # reconnect (or respawn the server) each time
+        self.mcp_stack = AsyncExitStack()
+        session = await self.mcp_stack.enter_async_context(self.mcp_client.session("style_guide"))
+        self.tools = await load_mcp_tools(session)
         self.agent = create_agent(
             model=self.llm,
             tools=self.tools,
-            system_prompt=self.system_prompt
+            system_prompt=self.system_prompt,
+            middleware=[SchedulerSlotMiddleware(self)] if self.scheduler else []
         )
 
-    async def run_audit(self, doc_path, status_callback=None):
+    async def close(self):
+        """Closes the MCP session (and a private server); reopened lazily on the next audit."""
+        if self.mcp_stack is not None:
+            await self.mcp_stack.aclose()
+        self.mcp_stack = None
+        self.tools = None
+        self.agent = None
+
+    async def run_audit(self, doc_path, status_callback=None, job_id=None, doc_name=None, rerun=False):
+        """
+        Audits a document as a checkpointed job. With rerun=True, existing
+        checkpoints are discarded and reports from previous audits are not
+        reused. With a trace_dir, the run is recorded as a timeline trace
+        (and sampled, if profile=True) across the auditor and its private MCP
+        server, which is shut down at the end so it writes out its data.
         """
-        Audits a document with optimizations:
+        if not self.trace_dir:
+            return await self._run_audit(doc_path, status_callback, job_id, doc_name, rerun)
+
+        # The MCP server inherits the run directory when it is spawned
+        if self.agent is None or self.trace_run_dir is None:
+            self.trace_run_dir = os.path.abspath(os.path.join(self.trace_dir, time.strftime("%Y%m%d-%H%M%S")))
+            os.makedirs(self.trace_run_dir, exist_ok=True)
+
+        self.tracer = Tracer("auditor")
+        profiler = SamplingProfiler() if self.profile else None
+        if profiler:
+            profiler.start()
+        try:
+            with self.tracer.span("run_audit", doc=doc_name or os.path.basename(doc_path)):
+                return await self._run_audit(doc_path, status_callback, job_id, doc_name, rerun)
+        finally:
+            if profiler:
+                profiler.stop()
+            await self.close()
+            self._export_trace(profiler)
+            self.tracer = None
+
+    def _export_trace(self, profiler=None):
+        """Merge auditor and MCP server events (and profiles) into one file each in the run directory."""
+        server_files = sorted(name for name in os.listdir(self.trace_run_dir) if name.startswith("mcp-"))
+        server_traces = [os.path.join(self.trace_run_dir, name) for name in server_files if name.endswith(".jsonl")]
+        self.last_trace_path = os.path.join(self.trace_run_dir, "trace.json")
+        merge_traces(self.last_trace_path, server_traces, self.tracer.events)
+        print(f"[AUDIT DEBUG] Trace written to {self.last_trace_path}", file=sys.stderr)
+
+        if profiler:
+            self.last_profile_path = os.path.join(self.trace_run_dir, "profile.txt")
+            profiler.dump(self.last_profile_path, process_name="auditor")
+            for name in server_files:
+                if name.endswith(".profile.folded"):
+                    server_profile = SamplingProfiler.from_folded(os.path.join(self.trace_run_dir, name))
+                    server_profile.dump(self.last_profile_path, process_name=name[:-len(".profile.folded")], append=True)
+            print(f"[AUDIT DEBUG] Profile written to {self.last_profile_path}", file=sys.stderr)
+
+    async def _run_audit(self, doc_path, status_callback=None, job_id=None, doc_name=None, rerun=False):
+        """
+        Audits a document as a checkpointed job:
         - Persistent agent initialization (avoid MCP respawning)
-        - Robust JSON extraction with multiple fallback patterns
-        - Deduplication of tool calls in paper trail
-        - Unfinished sentence detection
+        - Each finished chunk is checkpointed to the job store
+        - Re-running a job resumes after the last checkpoint and retries only failed chunks
+        - Finished jobs are returned straight from the store without starting the agent
+        - rerun=True starts the job over instead (e.g. after guide or settings changes)
         """
-        # Ensure agent is initialized (lazy init)
-        agent = await self.get_agent()
+        with maybe_span(self.tracer, "parse", "parse"):
+            parser = RedHatParser(doc_path)
+            chunks = parser.get_structured_content()
+
+        if job_id is None:
+            job_id = AuditJobStore.make_job_id(doc_path, self.model_name)
+        self.last_job_id = job_id
+        # Read by SchedulerSlotMiddleware to report queue positions
+        self.status_callback = status_callback
+
+        if rerun:
+            self.store.reset_job(job_id)
+
+        job = self.store.get_job(job_id)
+        completed = self.store.load_reports(job_id)
+        if job and job["status"] == "completed" and len(completed) == len(chunks):
+            print(f"[AUDIT DEBUG] Job {job_id} already completed, loading checkpoints", file=sys.stderr)
+            return [completed[i] for i in range(len(chunks))]
+
+        self.store.create_job(job_id, doc_name or os.path.basename(doc_path), self.model_name, len(chunks))
+        if completed:
+            print(f"[AUDIT DEBUG] Resuming job {job_id}: {len(completed)}/{len(chunks)} chunks checkpointed", file=sys.stderr)
+
+        # Group identical / near-identical paragraphs so each is audited once
+        fingerprints = []
+        duplicates = {}
+        if self.fingerprinter:
+            with maybe_span(self.tracer, "fingerprint", "dedup"):
+                fingerprints = [self.fingerprinter.fingerprint(c['text']) for c in chunks]
+                duplicates = self.fingerprinter.group(chunks, fingerprints)
+            print(f"[AUDIT DEBUG] {len(duplicates)}/{len(chunks)} chunks are duplicates of earlier chunks", file=sys.stderr)
 
-        parser = RedHatParser(doc_path)
-        chunks = parser.get_structured_content()
         report = []
+        failures = 0
+        failed_indices = set()
+        self.dedup_stats = {"audited": 0, "reused": 0}
+        # Resumed jobs add to the totals recorded by earlier runs
+        self.routing_stats = {**self._empty_routing_stats(), **(self.store.get_job_stats(job_id) or {})}
 
         for i, chunk in enumerate(chunks):
+            if i in completed:
+                report.append(completed[i])
+                continue
+
+            shared = self._find_shared_report(i, chunks, report, duplicates, fingerprints, failed_indices,
+                                             use_previous=not rerun)
+            if shared:
+                self.dedup_stats["reused"] += 1
+                self.store.save_chunk(job_id, i, shared)
+                report.append(shared)
+                continue
+
+            if self.tracer:
+                self.tracer.begin(("chunk", i), f"chunk {i+1}", "chunk", type=chunk['type'])
+
             # If a callback was provided, notify the UI we are starting a new chunk
-            if status_callback:
-                await status_callback(f"Analyzing chunk {i+1} of {len(chunks)}...")
-
-            # Check for unfinished sentences
-            sentence_warnings = self._check_sentence_completion(chunk['text'])
-
-            # Build sliding window context for coherence
-            context_parts = []
-
-            # Add previous chunk as context (if exists)
-            if i > 0:
-                prev_chunk = chunks[i - 1]
-                context_parts.append(f"[CONTEXT - Previous {prev_chunk['type']}]:\n{prev_chunk['text']}\n")
-
-            # Add current chunk (the one being audited)
-            context_parts.append(f"[CURRENT - {chunk['type']} to audit]:\n{chunk['text']}\n")
-
-            # Add next chunk as context (if exists)
-            if i < len(chunks) - 1:
-                next_chunk = chunks[i + 1]
-                context_parts.append(f"[CONTEXT - Next {next_chunk['type']}]:\n{next_chunk['text']}")
-
-            full_context = "\n".join(context_parts)
-            query = {"messages": [("human", full_context)]}
-
-            # Debug logging
-            print(f"\n[AUDIT DEBUG] Processing chunk {i+1}/{len(chunks)}", file=sys.stderr)
-            print(f"[AUDIT DEBUG] Chunk type: {chunk['type']}", file=sys.stderr)
-            print(f"[AUDIT DEBUG] Context length: {len(full_context)} chars", file=sys.stderr)
-
-            # We use the stream or events API to catch tool calls in real-time
-            result = await agent.ainvoke(query)
-
-            # Extract tool calls with deduplication
-            paper_trail = []
-            seen_queries = set()
-            tool_call_count = 0
-            for msg in result["messages"]:
-                if hasattr(msg, 'tool_calls') and msg.tool_calls:
-                    for tc in msg.tool_calls:
-                        tool_call_count += 1
-                        query_text = tc['args'].get('query', 'Style Rules')
-                        print(f"[AUDIT DEBUG] Tool call #{tool_call_count}: '{query_text}'", file=sys.stderr)
-
-                        if query_text not in seen_queries:
-                            seen_queries.add(query_text)
-                            call_info = f"🔍 Searching: {query_text}"
-                            paper_trail.append(call_info)
-                            # Notify UI of the specific tool call
-                            if status_callback:
+            await self._notify(status_callback, f"Analyzing chunk {i+1} of {len(chunks)}...")
+
+            try:
+                if self.triage_llm:
+                    async with self._ollama_slot(status_callback):
+                        with maybe_span(self.tracer, "triage", "triage"):
+                            needs_audit = await self._triage_chunk(chunk)
+                else:
+                    needs_audit = True
+
+                if not needs_audit:
+                    chunk_report = self._clean_report(chunk)
+                else:
+                    # Ensure agent is initialized (lazy init)
+                    with maybe_span(self.tracer, "get_agent", "mcp"):
+                        agent = await self.get_agent()
+                    audit_start = time.perf_counter()
+                    chunk_report = await self._audit_chunk(agent, chunks, i, status_callback)
+                    self.routing_stats["audit_seconds"] += time.perf_counter() - audit_start
+            except SchedulerFull as e:
+                # Backpressure: stop here, checkpoints so far are kept for a later resume
+                if self.tracer:
+                    self.tracer.end(("chunk", i), error=str(e))
+                self.store.set_status(job_id, "failed")
+                raise
+            except Exception as e:
+                if self.tracer:
+                    self.tracer.end(("chunk", i), error=str(e))
+                # Record the failure and keep going; the next run retries only this chunk
+                print(f"[AUDIT DEBUG] Chunk {i+1} failed: {e}", file=sys.stderr)
+                self.store.save_chunk_failure(job_id, i, str(e))
+                failures += 1
+                failed_indices.add(i)
+                report.append({
+                    "text": chunk['text'],
+                    "type": chunk['type'],
+                    "feedback": f"⚠️ Audit failed for this chunk: {e}. Re-run the audit to retry.",
+                    "proposed_text": chunk['text'],
+                    "paper_trail": [],
+                    "sentence_warnings": ""
+                })
+                continue
+
+            if self.tracer:
+                self.tracer.end(("chunk", i))
+            self.dedup_stats["audited"] += 1
+            self.store.save_chunk(job_id, i, chunk_report)
+            # Triage skips were never audited, so they aren't shared with other documents
+            if self.fingerprinter and self.guides_version and needs_audit:
+                self.store.save_fingerprint_report(self.model_name, self.guides_version, chunk['type'],
+                                                   fingerprints[i], chunk_report)
+            report.append(chunk_report)
+
+        print(f"[AUDIT DEBUG] Dedup: {self.dedup_stats['audited']} audited, {self.dedup_stats['reused']} reused", file=sys.stderr)
+        if self.triage_llm:
+            triaged = self.routing_stats["triaged"]
+            self.routing_stats["skip_rate"] = self.routing_stats["skipped"] / triaged if triaged else 0.0
+            print(f"[AUDIT DEBUG] Triage: {self.routing_stats['skipped']}/{triaged} chunks skipped "
+                  f"({self.routing_stats['skip_rate']:.0%})", file=sys.stderr)
+            self.store.save_job_stats(job_id, self.routing_stats)
+        self.store.set_status(job_id, "failed" if failures else "completed")
+        return report
+
+    @asynccontextmanager
+    async def _ollama_slot(self, status_callback=None):
+        """Scheduler slot for one model request (no-op without a scheduler)."""
+        if self.scheduler is None:
+            yield
+            return
+
+        async def on_wait(position):
+            await self._notify(status_callback, f"⏳ Waiting for Ollama: position {position} in queue...")
+
+        if self.tracer:
+            self.tracer.begin("scheduler_wait", "scheduler wait", "scheduler")
+        async with self.scheduler.slot(self.user_id, self.priority, on_wait=on_wait):
+            if self.tracer:
+                self.tracer.end("scheduler_wait")
+            yield
+
+    async def _notify(self, status_callback, text):
+        """Sends a status update to the UI, if a callback was provided."""
+        if status_callback:
+            with maybe_span(self.tracer, "ui_callback", "ui"):
+                await status_callback(text)
+
+    @staticmethod
+    def _empty_routing_stats():
+        return {
+            "triaged": 0,
+            "escalated": 0,
+            "skipped": 0,
+            "triage_errors": 0,
+            "skip_rate": 0.0,
+            "triage_seconds": 0.0,
+            "audit_seconds": 0.0
+        }
+
+    async def _triage_chunk(self, chunk) -> bool:
+        """
+        Asks the triage model whether a chunk likely violates the guides.
+        Returns True if the chunk should go to the full agent. Fails open:
+        any error or unparseable answer escalates the chunk.
+        """
+        start = time.perf_counter()
+        self.routing_stats["triaged"] += 1
+        try:
+            response = await self.triage_llm.ainvoke([("human", f"{self.triage_prompt}{chunk['text']}")])
+            parsed = self._extract_json(response.content)
+            needs_audit = parsed.get("needs_audit", True)
+            if isinstance(needs_audit, str):
+                needs_audit = needs_audit.strip().lower() != "false"
+            needs_audit = bool(needs_audit)
+        except Exception as e:
+            print(f"[AUDIT DEBUG] Triage failed, escalating: {e}", file=sys.stderr)
+            self.routing_stats["triage_errors"] += 1
+            needs_audit = True
+        finally:
+            self.routing_stats["triage_seconds"] += time.perf_counter() - start
+
+        self.routing_stats["escalated" if needs_audit else "skipped"] += 1
+        print(f"[AUDIT DEBUG] Triage: {'escalate' if needs_audit else 'skip'}", file=sys.stderr)
+        return needs_audit
+
+    def _clean_report(self, chunk):
+        """Fast 'no changes' report for chunks the triage model considers clean."""
+        sentence_warnings = self._check_sentence_completion(chunk['text'])
+        feedback = "No specific violations found."
+        if sentence_warnings:
+            feedback = f"{feedback}\n\n⚠️ Sentence issues: {sentence_warnings}"
+
+        return {
+            "text": chunk['text'],
+            "type": chunk['type'],
+            "feedback": feedback,
+            "proposed_text": chunk['text'],
+            "paper_trail": ["⚡ Triage: no likely violations"],
+            "sentence_warnings": sentence_warnings
+        }
+
+    def _find_shared_report(self, i, chunks, report, duplicates, fingerprints, failed_indices, use_previous=True):
+        """
+        Returns a report for chunk i reused from an already audited duplicate,
+        either earlier in this document or (if use_previous) from a previous
+        job. None if the chunk has to be audited itself.
+        """
+        if not self.fingerprinter:
+            return None
+
+        chunk = chunks[i]
+        if i in duplicates:
+            rep, similarity = duplicates[i]
+            if rep not in failed_indices:
+                return self._fan_out_report(report[rep], chunk, similarity, f"chunk {rep+1}")
+
+        if not use_previous or not self.guides_version:
+            return None
+        found = self.store.find_fingerprint_report(self.model_name, self.guides_version, chunk['type'],
+                                                   fingerprints[i], self.fingerprinter)
+        if found:
+            source_report, similarity = found
+            return self._fan_out_report(source_report, chunk, similarity, "a previous audit")
+        return None
+
+    def _fan_out_report(self, source_report, chunk, similarity, origin):
+        """Copies a representative's report onto a duplicate chunk."""
+        sentence_warnings = self._check_sentence_completion(chunk['text'])
+        paper_trail = [f"♻️ Reused audit of {origin}"] + [
+            p for p in source_report.get('paper_trail', []) if not p.startswith("♻️")
+        ]
+
+        # Sentence warnings belong to the source text, recompute them for this chunk
+        feedback = source_report['feedback'].split("\n\n⚠️ Sentence issues:")[0]
+
+        if similarity >= 1.0:
+            # Identical text: the feedback and rewrite apply as-is
+            proposed = source_report['proposed_text']
+        else:
+            # Near-identical text: the rewrite was made for different wording,
+            # so only the feedback carries over and the original is kept
+            feedback = (
+                f"{feedback}\n\nℹ️ Shared audit of a near-identical paragraph "
+                f"({int(similarity * 100)}% similar) - rewrite not applied."
+            )
+            proposed = chunk['text']
+
+        if sentence_warnings:
+            feedback = f"{feedback}\n\n⚠️ Sentence issues: {sentence_warnings}"
+
+        return {
+            "text": chunk['text'],
+            "type": chunk['type'],
+            "feedback": feedback,
+            "proposed_text": proposed,
+            "paper_trail": paper_trail,
+            "sentence_warnings": sentence_warnings
+        }
+
+    async def _audit_chunk(self, agent, chunks, i, status_callback=None):
+        """Runs the agent on a single chunk (with sliding-window context) and builds its report."""
+        chunk = chunks[i]
+
+        # Check for unfinished sentences
+        sentence_warnings = self._check_sentence_completion(chunk['text'])
+
+        # Build sliding window context for coherence
+        context_parts = []
+
+        # Add previous chunk as context (if exists)
+        if i > 0:
+            prev_chunk = chunks[i - 1]
+            context_parts.append(f"[CONTEXT - Previous {prev_chunk['type']}]:\n{prev_chunk['text']}\n")
+
+        # Add current chunk (the one being audited)
+        context_parts.append(f"[CURRENT - {chunk['type']} to audit]:\n{chunk['text']}\n")
+
+        # Add next chunk as context (if exists)
+        if i < len(chunks) - 1:
+            next_chunk = chunks[i + 1]
+            context_parts.append(f"[CONTEXT - Next {next_chunk['type']}]:\n{next_chunk['text']}")
+
+        full_context = "\n".join(context_parts)
+        query = {"messages": [("human", full_context)]}
+
+        # Debug logging
+        print(f"\n[AUDIT DEBUG] Processing chunk {i+1}/{len(chunks)}", file=sys.stderr)
+        print(f"[AUDIT DEBUG] Chunk type: {chunk['type']}", file=sys.stderr)
+        print(f"[AUDIT DEBUG] Context length: {len(full_context)} chars", file=sys.stderr)
+
+        # We use the stream or events API to catch tool calls in real-time
+        config = {"callbacks": [TraceCallbackHandler(self.tracer)]} if self.tracer else None
+        with maybe_span(self.tracer, "agent", "agent", chunk=i + 1):
+            result = await agent.ainvoke(query, config=config)
+
+        # Extract tool calls with deduplication
+        paper_trail = []
+        seen_queries = set()
+        tool_call_count = 0
+        for msg in result["messages"]:
+            if hasattr(msg, 'tool_calls') and msg.tool_calls:
+                for tc in msg.tool_calls:
+                    tool_call_count += 1
+                    query_text = tc['args'].get('query', 'Style Rules')
+                    print(f"[AUDIT DEBUG] Tool call #{tool_call_count}: '{query_text}'", file=sys.stderr)
+
+                    if query_text not in seen_queries:
+                        seen_queries.add(query_text)
+                        call_info = f"🔍 Searching: {query_text}"
+                        paper_trail.append(call_info)
+                        # Notify UI of the specific tool call
+                        if status_callback:
+                            with maybe_span(self.tracer, "ui_callback", "ui", sleep=True):
                                 await status_callback(call_info)
                                 # Reduced delay for better performance
                                 await asyncio.sleep(0.1)
 
-            if tool_call_count == 0:
-                print(f"[AUDIT DEBUG] ⚠️ WARNING: No tool calls made for this chunk!", file=sys.stderr)
+        if tool_call_count == 0:
+            print(f"[AUDIT DEBUG] ⚠️ WARNING: No tool calls made for this chunk!", file=sys.stderr)
 
-            # Parse the Final Response with robust JSON extraction
-            raw_content = result["messages"][-1].content
-            parsed = self._extract_json(raw_content)
+        # Parse the Final Response with robust JSON extraction
+        raw_content = result["messages"][-1].content
+        parsed = self._extract_json(raw_content)
 
-            feedback = parsed.get("feedback", "No specific violations found.")
-            proposed = parsed.get("proposed_text", chunk['text'])
+        feedback = parsed.get("feedback", "No specific violations found.")
+        proposed = parsed.get("proposed_text", chunk['text'])
 
-            # Validate that proposed text doesn't include context markers
-            # (LLM should only return the current chunk, not context)
-            proposed = self._strip_context_markers(proposed)
+        # Validate that proposed text doesn't include context markers
+        # (LLM should only return the current chunk, not context)
+        proposed = self._strip_context_markers(proposed)
 
-            # Sanity check: if proposed text is way longer than original, keep original
-            # (indicates LLM may have included context)
-            if len(proposed) > len(chunk['text']) * 2.5:
-                feedback = f"{feedback}\n\n⚠️ AI response too long (may include context) - using original text."
-                proposed = chunk['text']
+        # Sanity check: if proposed text is way longer than original, keep original
+        # (indicates LLM may have included context)
+        if len(proposed) > len(chunk['text']) * 2.5:
+            feedback = f"{feedback}\n\n⚠️ AI response too long (may include context) - using original text."
+            proposed = chunk['text']
 
-            # Append sentence warnings to feedback
-            if sentence_warnings:
-                feedback = f"{feedback}\n\n⚠️ Sentence issues: {sentence_warnings}"
+        # Append sentence warnings to feedback
+        if sentence_warnings:
+            feedback = f"{feedback}\n\n⚠️ Sentence issues: {sentence_warnings}"
 
-            report.append({
-                "text": chunk['text'],
-                "type": chunk['type'],
-                "feedback": feedback,
-                "proposed_text": proposed,
-                "paper_trail": paper_trail,
-                "sentence_warnings": sentence_warnings
-            })
-
-        return report
+        return {
+            "text": chunk['text'],
+            "type": chunk['type'],
+            "feedback": feedback,
+            "proposed_text": proposed,
+            "paper_trail": paper_trail,
+            "sentence_warnings": sentence_warnings
+        }
 
     def _strip_context_markers(self, text: str) -> str:
         """
@@ -243,7 +693,8 @@ class RedHatAuditor:
 
         return "; ".join(warnings)
 
-    def calculate_metrics(self, report):
+    @staticmethod
+    def calculate_metrics(report):
         """
         Generates scores for the 5 Cs based on keywords in feedback.
         Optimized with regex pre-compilation.
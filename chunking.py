@@ -0,0 +1,150 @@
+import re
+import hashlib
+from typing import Dict, List
+from snippet_compressor import split_units
+
+HEADING = re.compile(r'^(#{1,6})\s+(.*)$')
+
+# Bump when chunk text or metadata changes, so existing indexes are rebuilt
+CHUNKER_VERSION = 2
+
+class TokenAwareChunker:
+    """
+    Heading-structured chunker sized by the embedding model's tokenizer.
+
+    Guides are split into units (headings, list items, sentences) and packed
+    greedily into chunks that fit the model's input window exactly, so no
+    text is silently truncated at embedding time. A new chunk starts at a
+    heading once the current one is half full; chunks that start mid-section
+    repeat the section heading for context. Overlap is whole trailing
+    sentences, at most `overlap_tokens`. Short sections share a chunk, so a
+    chunk's 'section' lists every heading it contains.
+    """
+
+    def __init__(self, tokenizer, max_tokens: int, overlap_tokens: int = 32):
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+
+    @classmethod
+    def from_embeddings(cls, embeddings, overlap_tokens: int = 32):
+        """Size chunks for a HuggingFaceEmbeddings / SentenceTransformer model."""
+        model = embeddings.client
+        # Leave room for the special tokens the model adds around the input
+        special = model.tokenizer.num_special_tokens_to_add(pair=False)
+        return cls(model.tokenizer, model.max_seq_length - special, overlap_tokens)
+
+    @property
+    def signature(self) -> str:
+        """Identifies the chunking configuration, so index rebuilds follow config changes."""
+        config = f"{CHUNKER_VERSION}:{getattr(self.tokenizer, 'name_or_path', '')}:{self.max_tokens}:{self.overlap_tokens}"
+        return hashlib.md5(config.encode()).hexdigest()
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+    def _split_long_unit(self, unit: Dict, budget: int) -> List[Dict]:
+        """Split a unit that alone exceeds the budget at word boundaries."""
+        pieces = []
+        words = []
+        tokens = 0
+        for word in unit["text"].split():
+            word_tokens = self.count_tokens(word)
+            if words and tokens + word_tokens > budget:
+                pieces.append(" ".join(words))
+                words, tokens = [], 0
+            words.append(word)
+            tokens += word_tokens
+        if words:
+            pieces.append(" ".join(words))
+        return [
+            {"text": piece, "heading": False, "newline": unit["newline"] and i == 0, "tokens": self.count_tokens(piece)}
+            for i, piece in enumerate(pieces)
+        ]
+
+    def split(self, text: str) -> List[Dict]:
+        """Returns chunks as dicts with 'text', 'section' and 'tokens'."""
+        chunks = []
+        current = []
+        current_tokens = 0
+        section_heading = None
+
+        def render(units):
+            parts = []
+            previous = None
+            for unit in units:
+                if previous is not None:
+                    parts.append("\n" if unit["newline"] or previous["heading"] else " ")
+                parts.append(unit["text"])
+                previous = unit
+            return "".join(parts)
+
+        def section_of(units):
+            titles = []
+            for unit in units:
+                if unit["heading"]:
+                    match = HEADING.match(unit["text"])
+                    title = match.group(2).strip() if match else unit["text"].strip("# ")
+                    if title not in titles:
+                        titles.append(title)
+            return "; ".join(titles)
+
+        def flush(carry_overlap: bool):
+            nonlocal current, current_tokens
+            if not any(not unit["heading"] for unit in current):
+                # Nothing but headings: keep them for the next chunk
+                return
+            chunk_text = render(current)
+            chunks.append({
+                "text": chunk_text,
+                "section": section_of(current),
+                "tokens": self.count_tokens(chunk_text)
+            })
+
+            # Start the next chunk with the section heading and the
+            # trailing sentences that fit the overlap budget
+            next_units = []
+            if section_heading is not None:
+                next_units.append({**section_heading, "carried": True})
+            if carry_overlap and self.overlap_tokens:
+                overlap = []
+                overlap_tokens = 0
+                for unit in reversed(current):
+                    if unit["heading"] or overlap_tokens + unit["tokens"] > self.overlap_tokens:
+                        break
+                    overlap.insert(0, {**unit, "carried": True})
+                    overlap_tokens += unit["tokens"]
+                next_units.extend(overlap)
+            current = next_units
+            current_tokens = sum(unit["tokens"] for unit in current)
+
+        for unit in split_units(text):
+            unit = {**unit, "tokens": self.count_tokens(unit["text"])}
+
+            if unit["heading"]:
+                # Start a new chunk at a heading once the current one is half full
+                if current_tokens > self.max_tokens // 2:
+                    flush(carry_overlap=False)
+                # A new section makes the carried-over heading and overlap stale
+                if all(u.get("carried") for u in current):
+                    current, current_tokens = [], 0
+                section_heading = unit
+                current.append(unit)
+                current_tokens += unit["tokens"]
+                continue
+
+            # Budget for body text, leaving room for a repeated heading
+            heading_tokens = section_heading["tokens"] if section_heading else 0
+            for piece in self._split_long_unit(unit, self.max_tokens - heading_tokens) \
+                    if unit["tokens"] > self.max_tokens - heading_tokens else [unit]:
+                if current_tokens + piece["tokens"] > self.max_tokens:
+                    flush(carry_overlap=True)
+                    # Drop overlap if it would push the piece over the limit
+                    if current_tokens + piece["tokens"] > self.max_tokens:
+                        current = [{**section_heading, "carried": True}] if section_heading is not None else []
+                        current_tokens = heading_tokens
+                current.append(piece)
+                current_tokens += piece["tokens"]
+
+        flush(carry_overlap=False)
+        return chunks
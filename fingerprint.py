@@ -0,0 +1,119 @@
+import re
+import math
+import hashlib
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Tuple
+
+# Short paragraphs (headings, labels) don't carry enough words for a
+# meaningful similarity, so they are only ever grouped on exact matches.
+MIN_WORDS_FOR_NEAR_MATCH = 8
+
+def normalize_text(text: str) -> str:
+    """Lowercase and collapse whitespace so trivial formatting differences hash the same."""
+    return re.sub(r'\s+', ' ', text.strip().lower())
+
+def exact_hash(text: str) -> str:
+    """Content hash of the normalized text."""
+    return hashlib.md5(normalize_text(text).encode()).hexdigest()
+
+def word_tokens(text: str) -> List[str]:
+    """Words of the normalized text, ignoring punctuation."""
+    return re.findall(r'\w+', normalize_text(text))
+
+def _ratio_at_least(matcher: SequenceMatcher, threshold: float) -> float:
+    # The cheap upper bounds skip most pairs before the full comparison
+    if matcher.real_quick_ratio() < threshold or matcher.quick_ratio() < threshold:
+        return 0.0
+    return matcher.ratio()
+
+def word_similarity(a: List[str], b: List[str], threshold: float = 0.0) -> float:
+    """
+    Share of words two paragraphs have in common, in order: 2 * matched /
+    total words, so one changed word in a 45-word notice scores ~0.98.
+    Returns 0.0 early when it can't reach `threshold`.
+    """
+    return _ratio_at_least(SequenceMatcher(None, a, b, autojunk=False), threshold)
+
+def word_count_range(word_count: int, threshold: float) -> Tuple[int, int]:
+    """Word counts another paragraph can have and still reach `threshold` similarity."""
+    # similarity <= 2 * min(a, b) / (a + b)
+    return (
+        math.ceil(word_count * threshold / (2 - threshold)),
+        math.floor(word_count * (2 - threshold) / threshold)
+    )
+
+class ChunkFingerprinter:
+    """
+    Groups identical and near-identical paragraphs so boilerplate
+    (disclaimers, legal notices, product blurbs) is audited only once.
+    """
+
+    def __init__(self, threshold: float = 0.9):
+        # threshold=1.0 only groups exact duplicates
+        self.threshold = threshold
+
+    def fingerprint(self, text: str) -> Dict:
+        words = word_tokens(text)
+        return {
+            "exact": exact_hash(text),
+            "words": words,
+            "near_eligible": len(words) >= MIN_WORDS_FOR_NEAR_MATCH
+        }
+
+    def is_near_match(self, a: Dict, b: Dict) -> Tuple[bool, float]:
+        """Returns (match, similarity) for two fingerprints."""
+        if a["exact"] == b["exact"]:
+            return True, 1.0
+        if self.threshold >= 1.0 or not (a["near_eligible"] and b["near_eligible"]):
+            return False, 0.0
+        similarity = word_similarity(a["words"], b["words"], self.threshold)
+        return similarity >= self.threshold, similarity
+
+    def best_near_match(self, fingerprint: Dict, candidates: List[Dict]) -> Optional[Tuple[int, float]]:
+        """
+        Returns (position, similarity) of the candidate most similar to
+        `fingerprint` at or above the threshold, or None. The fingerprint's
+        words are indexed once and compared against every candidate.
+        """
+        if self.threshold >= 1.0 or not fingerprint["near_eligible"]:
+            return None
+        matcher = SequenceMatcher(None, autojunk=False)
+        matcher.set_seq2(fingerprint["words"])
+        best = None
+        for position, candidate in enumerate(candidates):
+            if not candidate["near_eligible"]:
+                continue
+            matcher.set_seq1(candidate["words"])
+            similarity = _ratio_at_least(matcher, self.threshold)
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (position, similarity)
+        return best
+
+    def group(self, chunks: List[Dict], fingerprints: List[Dict] = None) -> Dict[int, Tuple[int, float]]:
+        """
+        Maps each duplicate chunk index to (representative index, similarity).
+        The representative is always the first occurrence, and only chunks of
+        the same type are grouped together.
+        """
+        if fingerprints is None:
+            fingerprints = [self.fingerprint(c['text']) for c in chunks]
+        duplicates = {}
+        exact_reps = {}
+        near_reps = {}
+
+        for i, (chunk, fp) in enumerate(zip(chunks, fingerprints)):
+            key = (chunk['type'], fp["exact"])
+            if key in exact_reps:
+                duplicates[i] = (exact_reps[key], 1.0)
+                continue
+
+            reps = near_reps.setdefault(chunk['type'], [])
+            match = self.best_near_match(fp, [fingerprints[rep] for rep in reps])
+            if match:
+                duplicates[i] = (reps[match[0]], match[1])
+            else:
+                exact_reps[key] = i
+                if fp["near_eligible"]:
+                    reps.append(i)
+
+        return duplicates
@@ -1,8 +1,11 @@
 import os
+import hashlib
 from docx import Document
 from typing import List, Dict
 from docling.document_converter import DocumentConverter
 
+SUPPORTED_GUIDE_EXTENSIONS = ('.md', '.pdf', '.docx', '.html', '.htm', '.txt')
+
 class RedHatParser:
     def __init__(self, file_path: str):
         self.file_path = file_path
@@ -56,32 +59,68 @@ def process_document_with_docling(file_path: str) -> str:
     except Exception as e:
         return f"Error processing {file_path} with docling: {str(e)}"
 
-def load_guides(guides_dir: str = "guides") -> Dict[str, str]:
+def guide_id(filename: str) -> str:
+    """
+    Stable identifier for a guide file, stored in the index metadata and in
+    .hidden_guides.json. The file name (with extension) is unique per directory.
+    """
+    return os.path.basename(filename)
+
+def load_guide_entries(guides_dir: str = "guides") -> List[Dict[str, str]]:
     """
     Reads all document files in the guides directory using docling.
     Supports: .md, .pdf, .docx, .html, .htm, .txt
+    Returns one entry per file with its 'guide_id', display 'name' and 'content'.
     """
-    guides_context = {}
+    entries = []
     if not os.path.exists(guides_dir):
         os.makedirs(guides_dir)
-        return {"error": "Guides directory was missing and has been created."}
+        return entries
 
-    supported_extensions = ('.md', '.pdf', '.docx', '.html', '.htm', '.txt')
-
-    for filename in os.listdir(guides_dir):
+    for filename in sorted(os.listdir(guides_dir)):
         file_path = os.path.join(guides_dir, filename)
 
-        if filename.lower().endswith(supported_extensions):
-            guide_name = os.path.splitext(filename)[0]
-
+        if filename.lower().endswith(SUPPORTED_GUIDE_EXTENSIONS):
             # Use docling for all formats except plain markdown
             if filename.endswith('.md'):
                 with open(file_path, "r", encoding="utf-8") as f:
-                    guides_context[guide_name] = f.read()
+                    content = f.read()
             else:
-                guides_context[guide_name] = process_document_with_docling(file_path)
+                content = process_document_with_docling(file_path)
+
+            entries.append({
+                "guide_id": guide_id(filename),
+                "name": os.path.splitext(filename)[0],
+                "content": content
+            })
+
+    return entries
+
+def guides_signature(guides_dir: str = "guides", hidden_guides=()) -> str:
+    """
+    Hash of the visible guide files' contents, identifying the rule set an
+    audit ran against. Reads raw bytes only, so it is cheap to call per audit.
+    """
+    digest = hashlib.md5()
+    if os.path.exists(guides_dir):
+        for filename in sorted(os.listdir(guides_dir)):
+            if not filename.lower().endswith(SUPPORTED_GUIDE_EXTENSIONS) or guide_id(filename) in hidden_guides:
+                continue
+            digest.update(guide_id(filename).encode())
+            with open(os.path.join(guides_dir, filename), "rb") as f:
+                digest.update(hashlib.md5(f.read()).digest())
+    return digest.hexdigest()
+
+def load_guides(guides_dir: str = "guides") -> Dict[str, str]:
+    """
+    Reads all document files in the guides directory using docling.
+    Supports: .md, .pdf, .docx, .html, .htm, .txt
+    """
+    if not os.path.exists(guides_dir):
+        os.makedirs(guides_dir)
+        return {"error": "Guides directory was missing and has been created."}
 
-    return guides_context
+    return {entry["name"]: entry["content"] for entry in load_guide_entries(guides_dir)}
 
 # Example usage for testing:
 if __name__ == "__main__":
@@ -1,19 +1,29 @@
 import os
+import sys
 import json
+import asyncio
 import hashlib
-from parser import load_guides
+from parser import load_guide_entries
 from mcp.server.fastmcp import FastMCP
-from langchain_community.vectorstores import Chroma
+from vector_index import VectorIndexManager, VECTOR_DB_DIR, INDEX_LAYOUT_VERSION
+from snippet_compressor import SnippetCompressor, split_units
+from chunking import TokenAwareChunker
+from tracing import (
+    get_process_tracer, get_process_profiler, flush_process_tracer, close_process_tracing, maybe_span, maybe_track
+)
 from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 
 mcp = FastMCP("RedHatStyleAuditor")
 
+# Opt-in timeline tracing, enabled by the auditor through AUDIT_TRACE_DIR
+tracer = get_process_tracer("mcp-style-server")
+# Opt-in sampling of the event loop thread and search worker threads (AUDIT_PROFILE)
+profiler = get_process_profiler()
+
 current_dir = os.path.dirname(os.path.abspath(__file__))
 GUIDES_DIR = os.path.join(current_dir, "guides")
 HIDDEN_GUIDES_FILE = os.path.join(current_dir, ".hidden_guides.json")
-VECTOR_DB_DIR = os.path.join(current_dir, ".vector_db")
 
 # Initialize embeddings model (upgraded for better semantic search quality)
 # all-mpnet-base-v2 is significantly better than all-MiniLM-L6-v2 for semantic similarity
@@ -23,6 +33,23 @@ embeddings = HuggingFaceEmbeddings(
     encode_kwargs={'normalize_embeddings': True}  # Improves cosine similarity
 )
 
+# Chunks are sized by the embedding model's own tokenizer so they fit its
+# input window exactly (mpnet truncates at 384 tokens)
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+chunker = TokenAwareChunker.from_embeddings(embeddings, overlap_tokens=CHUNK_OVERLAP_TOKENS)
+
+# Versioned index generations under VECTOR_DB_DIR
+index_manager = VectorIndexManager(VECTOR_DB_DIR, embeddings)
+
+# Search results are cut down to the most relevant sentences / rule blocks
+# within this many characters per tool response (0 disables compression)
+SEARCH_CHAR_BUDGET = int(os.getenv("SEARCH_CHAR_BUDGET", "2000"))
+snippet_compressor = SnippetCompressor(
+    embeddings,
+    char_budget=SEARCH_CHAR_BUDGET,
+    count_tokens=chunker.count_tokens
+)
+
 # Global vector store
 vector_store = None
 last_guides_hash = None
@@ -37,149 +64,287 @@ def get_hidden_guides():
             return set()
     return set()
 
-def get_guides_hash(guides_dict):
-    """Generate hash of guides content to detect changes."""
-    content = json.dumps(sorted(guides_dict.items()), sort_keys=True)
+def get_guides_hash(guide_entries):
+    """Generate hash of guides content, chunking config and index layout to detect changes."""
+    content = json.dumps([INDEX_LAYOUT_VERSION, chunker.signature] + sorted((g["guide_id"], g["content"]) for g in guide_entries))
     return hashlib.md5(content.encode()).hexdigest()
 
+def get_visibility_filter():
+    """
+    Chroma metadata filter that excludes hidden guides. Visibility is applied
+    at search time, so toggling a guide never triggers re-embedding.
+    """
+    hidden_guides = get_hidden_guides()
+    if not hidden_guides:
+        return None
+    return {"guide_id": {"$nin": sorted(hidden_guides)}}
+
 def initialize_vector_store():
-    """Initialize or update the vector store with chunked guide content."""
+    """Initialize or update the vector store with chunked content of all guides."""
     global vector_store, last_guides_hash
 
     if not os.path.exists(GUIDES_DIR):
         return None
 
-    # Load all guides
-    all_guides = load_guides(GUIDES_DIR)
-    hidden_guides = get_hidden_guides()
-
-    # Filter out hidden guides
-    active_guides = {
-        name: content for name, content in all_guides.items()
-        if not any(name in filename for filename in hidden_guides)
-    }
+    # Index every guide; hidden guides are filtered out at query time
+    with maybe_span(tracer, "load_guides", "index"):
+        guide_entries = load_guide_entries(GUIDES_DIR)
 
     # Check if we need to rebuild
-    current_hash = get_guides_hash(active_guides)
+    current_hash = get_guides_hash(guide_entries)
     if vector_store is not None and current_hash == last_guides_hash:
         return vector_store
 
-    # Chunk the documents with improved settings for better retrieval
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1200,      # Increased from 500 to capture more context
-        chunk_overlap=200,    # Increased from 50 to preserve continuity
-        separators=["\n# ", "\n## ", "\n### ", "\n\n", "\n", ". ", " ", ""]  # Added heading separators
-    )
+    # Reuse the live generation if it was built from the same guides
+    existing = index_manager.open_current(current_hash)
+    if existing is not None:
+        vector_store = existing
+        last_guides_hash = current_hash
+        return vector_store
 
+    # Chunk by heading structure, sized to the embedding model's token window
     documents = []
-    for guide_name, content in active_guides.items():
-        chunks = text_splitter.split_text(content)
+    seen_chunks = set()
+    total_tokens = 0
+    for guide in guide_entries:
+        chunks = chunker.split(guide["content"])
         for i, chunk in enumerate(chunks):
-            # Extract potential section header from chunk for better metadata
-            lines = chunk.split('\n')
-            section_header = ""
-            for line in lines:
-                if line.startswith('#'):
-                    section_header = line.strip('#').strip()
-                    break
+            # Identical chunks only waste top_k slots at search time. Dedup is
+            # per guide so hiding one guide never drops another guide's text
+            chunk_hash = (guide["guide_id"], hashlib.md5(chunk["text"].encode()).hexdigest())
+            if chunk_hash in seen_chunks:
+                continue
+            seen_chunks.add(chunk_hash)
+            total_tokens += chunk["tokens"]
 
             documents.append(Document(
-                page_content=chunk,
+                page_content=chunk["text"],
                 metadata={
-                    "source": guide_name,
+                    "guide_id": guide["guide_id"],
+                    "source": guide["name"],
                     "chunk": i,
-                    "section": section_header  # Add section context
+                    "section": chunk["section"],  # Add section context
+                    "tokens": chunk["tokens"]
                 }
             ))
 
+    print(f"[MCP DEBUG] Chunked guides into {len(documents)} chunks, {total_tokens} tokens "
+          f"(max {chunker.max_tokens} per chunk)", file=sys.stderr)
+
     if not documents:
         return None
 
-    # Create new vector store
-    vector_store = Chroma.from_documents(
-        documents=documents,
-        embedding=embeddings,
-        persist_directory=VECTOR_DB_DIR
-    )
+    # Build a new generation and swap it in
+    # Unit vectors for snippet scoring are computed once here, not per query
+    unit_texts = [
+        unit["text"]
+        for doc in documents for unit in split_units(doc.page_content)
+        if not unit["heading"]
+    ]
+    with maybe_span(tracer, "build_index", "index", chunks=len(documents), units=len(unit_texts)):
+        vector_store = index_manager.build(documents, current_hash, unit_texts=unit_texts)
 
     last_guides_hash = current_hash
     return vector_store
 
+# Concurrent tool calls that arrive within this window are embedded and
+# searched together in one batch
+SEARCH_BATCH_WINDOW_MS = float(os.getenv("SEARCH_BATCH_WINDOW_MS", "10"))
+SEARCH_MAX_BATCH = int(os.getenv("SEARCH_MAX_BATCH", "32"))
+
+class QueryBatcher:
+    """
+    Micro-batches concurrent search queries: one embedding forward pass and
+    one vector-store query per batch, with results routed back to each caller.
+    When the app runs this server shared over HTTP, queries from concurrent
+    audits in all sessions land in the same batches.
+    """
+
+    def __init__(self, window_ms: float = SEARCH_BATCH_WINDOW_MS, max_batch: int = SEARCH_MAX_BATCH):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.queue = None
+        self.worker = None
+
+    async def search(self, query: str, top_k: int):
+        """Queue a query and wait for its formatted search response."""
+        loop = asyncio.get_running_loop()
+        if self.worker is None or self.worker.done():
+            self.queue = asyncio.Queue()
+            self.worker = loop.create_task(self._run())
+
+        future = loop.create_future()
+        await self.queue.put((query, top_k, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+
+            # Gather whatever else arrives within the batching window
+            with maybe_span(tracer, "batch_window", "search"):
+                deadline = loop.time() + self.window
+                while len(batch) < self.max_batch:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+
+            requests = [(query, top_k) for query, top_k, _ in batch]
+            print(f"[MCP DEBUG] Searching batch of {len(batch)} queries", file=sys.stderr)
+
+            try:
+                # Embedding and search are blocking, keep them off the event loop
+                responses = await asyncio.to_thread(search_batch, requests)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, _, future), response in zip(batch, responses):
+                if not future.done():
+                    future.set_result(response)
+
+def search_batch(requests):
+    """
+    Embeds all queries in one forward pass, searches them in one vector-store
+    call and compresses all results together. Returns the formatted tool
+    response per (query, top_k) request, or None per request when no guides
+    are available.
+    """
+    # Runs in a worker thread, which the profiler samples only meanwhile
+    with maybe_track(profiler):
+        with maybe_span(tracer, "initialize_vector_store", "index"):
+            store = initialize_vector_store()
+        if store is None:
+            return [None] * len(requests)
+
+        queries = [query for query, _ in requests]
+        with maybe_span(tracer, "embed_queries", "embedding", batch_size=len(queries)):
+            vectors = embeddings.embed_documents(queries)
+
+        # Fetch more candidates than needed so filtering still leaves top_k
+        with maybe_span(tracer, "vector_search", "search", batch_size=len(queries)):
+            response = store._collection.query(
+                query_embeddings=vectors,
+                n_results=max(top_k for _, top_k in requests) * 2,
+                where=get_visibility_filter(),
+                include=["documents", "metadatas", "distances"]
+            )
+
+        selected = []
+        for (query, top_k), docs, metadatas, distances in zip(
+            requests, response["documents"], response["metadatas"], response["distances"]
+        ):
+            results = [
+                (Document(page_content=doc, metadata=metadata or {}), distance)
+                for doc, metadata, distance in zip(docs, metadatas, distances)
+            ][:top_k * 2]
+            print(f"[MCP DEBUG] Found {len(results)} results for '{query}'", file=sys.stderr)
+            selected.append(select_results(results, top_k) if results else None)
+
+        # Keep only the sentences / rule blocks most relevant to each query
+        with maybe_span(tracer, "compress_results", "compression"):
+            contents = snippet_compressor.compress_batch(
+                vectors,
+                [[doc.page_content for doc, _ in results or []] for results in selected],
+                unit_lookup=lambda keys: VectorIndexManager.unit_vectors(store, keys)
+            )
+
+        return [
+            "No specific guideline found." if results is None else format_search_results(results, snippets)
+            for results, snippets in zip(selected, contents)
+        ]
+
+query_batcher = QueryBatcher()
+
+def select_results(results, top_k):
+    """Filters and deduplicates (doc, score) results, returning up to top_k (doc, relevance) pairs."""
+    # Filter and deduplicate results
+    seen_content = set()
+    selected = []
+
+    for idx, (doc, score) in enumerate(results):
+        # Skip if we've seen very similar content
+        content_hash = hash(doc.page_content[:200])
+        if content_hash in seen_content:
+            print(f"[MCP DEBUG] Skipping duplicate result {idx+1}", file=sys.stderr)
+            continue
+        seen_content.add(content_hash)
+
+        # Skip results with very poor relevance (score > 1.5 is usually irrelevant for cosine)
+        if score > 1.5:
+            print(f"[MCP DEBUG] Skipping low-relevance result {idx+1} (score={score:.4f})", file=sys.stderr)
+            continue
+
+        # Normalize score to percentage (lower score = better match)
+        relevance = max(0, min(100, int((1.5 - score) / 1.5 * 100)))
+
+        source = doc.metadata.get('source', 'Unknown')
+        section = doc.metadata.get('section', '')
+        print(f"[MCP DEBUG] Result {idx+1}: {source} (score={score:.4f}, relevance={relevance}%)", file=sys.stderr)
+        if section:
+            print(f"[MCP DEBUG]   Section: {section}", file=sys.stderr)
+        print(f"[MCP DEBUG]   Content preview: {doc.page_content[:150]}...", file=sys.stderr)
+
+        selected.append((doc, relevance))
+        if len(selected) >= top_k:
+            break
+
+    return selected
+
+def format_search_results(selected, snippets):
+    """Formats selected results with their (compressed) content for the agent."""
+    formatted_results = []
+
+    for (doc, relevance), snippet in zip(selected, snippets):
+        # Results that contributed nothing within the budget are dropped
+        if not snippet:
+            continue
+
+        source = doc.metadata.get('source', 'Unknown')
+        section = doc.metadata.get('section', '')
+
+        # Include section header in output if available
+        header = f"📚 {source}"
+        if section:
+            header += f" - {section}"
+        header += f" (relevance: {relevance}%)"
+
+        formatted_results.append(f"{header}\n{snippet}")
+
+    if not formatted_results:
+        return "No relevant guidelines found for this query."
+
+    return "\n\n---\n\n".join(formatted_results)
+
 @mcp.tool()
-def search_style_guides(query: str, top_k: int = 5) -> str:
+async def search_style_guides(query: str, top_k: int = 5) -> str:
     """Intelligently searches W.I.P style guides using semantic search.
 
     Args:
         query: The search query (e.g., 'passive voice', 'acronyms')
         top_k: Number of most relevant chunks to return (default: 5, increased from 3)
     """
-    import sys
-
     # Debug logging to stderr (will show in terminal)
     print(f"[MCP DEBUG] Tool called with query: '{query}', top_k={top_k}", file=sys.stderr)
 
     try:
-        store = initialize_vector_store()
-        if store is None:
+        # Concurrent calls are batched together by the query batcher
+        with maybe_span(tracer, "search_style_guides", "tool", query=query):
+            response = await query_batcher.search(query, top_k)
+        flush_process_tracer()
+
+        if response is None:
             print("[MCP DEBUG] ERROR: Vector store is None", file=sys.stderr)
             return "Error: No style guides available."
 
-        print(f"[MCP DEBUG] Vector store initialized successfully", file=sys.stderr)
-
-        # Perform semantic search with more candidates to filter
-        results = store.similarity_search_with_score(query, k=top_k * 2)
-
-        if not results:
-            print("[MCP DEBUG] No results found for query", file=sys.stderr)
-            return "No specific guideline found."
-
-        print(f"[MCP DEBUG] Found {len(results)} results", file=sys.stderr)
-
-        # Filter and deduplicate results
-        seen_content = set()
-        formatted_results = []
-        result_count = 0
-
-        for idx, (doc, score) in enumerate(results):
-            # Skip if we've seen very similar content
-            content_hash = hash(doc.page_content[:200])
-            if content_hash in seen_content:
-                print(f"[MCP DEBUG] Skipping duplicate result {idx+1}", file=sys.stderr)
-                continue
-            seen_content.add(content_hash)
-
-            # Skip results with very poor relevance (score > 1.5 is usually irrelevant for cosine)
-            if score > 1.5:
-                print(f"[MCP DEBUG] Skipping low-relevance result {idx+1} (score={score:.4f})", file=sys.stderr)
-                continue
-
-            source = doc.metadata.get('source', 'Unknown')
-            section = doc.metadata.get('section', '')
-
-            # Normalize score to percentage (lower score = better match)
-            relevance = max(0, min(100, int((1.5 - score) / 1.5 * 100)))
-
-            print(f"[MCP DEBUG] Result {idx+1}: {source} (score={score:.4f}, relevance={relevance}%)", file=sys.stderr)
-            if section:
-                print(f"[MCP DEBUG]   Section: {section}", file=sys.stderr)
-            print(f"[MCP DEBUG]   Content preview: {doc.page_content[:150]}...", file=sys.stderr)
-
-            # Include section header in output if available
-            header = f"📚 {source}"
-            if section:
-                header += f" - {section}"
-            header += f" (relevance: {relevance}%)"
-
-            formatted_results.append(f"{header}\n{doc.page_content}")
-
-            result_count += 1
-            if result_count >= top_k:
-                break
-
-        if not formatted_results:
-            return "No relevant guidelines found for this query."
-
-        return "\n\n---\n\n".join(formatted_results)
+        return response
 
     except Exception as e:
         print(f"[MCP DEBUG] Exception occurred: {str(e)}", file=sys.stderr)
@@ -188,4 +353,24 @@ def search_style_guides(query: str, top_k: int = 5) -> str:
         return f"Search error: {str(e)}"
 
 if __name__ == "__main__":
-    mcp.run()
+    # Maintenance commands: `python redhat_style_server.py compact|stats`
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == "compact":
+        # Run by hand, so previous generations can go as well
+        removed = index_manager.compact(keep_previous=0)
+        print(f"Removed {len(removed)} stale index entries: {', '.join(removed) or 'none'}")
+        print(json.dumps(index_manager.stats(), indent=2))
+    elif command == "stats":
+        print(json.dumps(index_manager.stats(), indent=2))
+    elif command == "serve":
+        # Shared server for all audits of an app process (see style_server.py):
+        # `python redhat_style_server.py serve <port>`
+        mcp.settings.host = "127.0.0.1"
+        mcp.settings.port = int(sys.argv[2]) if len(sys.argv) > 2 else mcp.settings.port
+        mcp.run(transport="streamable-http")
+    else:
+        try:
+            mcp.run()
+        finally:
+            # The auditor closes our stdin when the audit ends; write what's left
+            close_process_tracing()
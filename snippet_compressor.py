@@ -0,0 +1,188 @@
+import re
+import sys
+import hashlib
+from collections import OrderedDict
+from typing import Dict, List
+
+# Rough chars-per-token ratio used for token estimates when no tokenizer is given
+CHARS_PER_TOKEN = 4
+
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9"\'(\[*`])')
+LIST_ITEM = re.compile(r'^\s*([-*•+]|\d+[.)]|\|)\s*')
+
+def split_units(text: str) -> List[Dict]:
+    """
+    Splits guide text into units: list items and table rows stay whole (they
+    are usually one rule each), paragraphs are split into sentences. Headings
+    are returned as context units that are never scored. `newline` marks units
+    that start on a new line (headings, list items, first sentence of a
+    paragraph). Shared by result compression and guide chunking.
+    """
+    units = []
+    paragraph = []
+
+    def flush():
+        if paragraph:
+            sentences = [s.strip() for s in SENTENCE_SPLIT.split(" ".join(paragraph)) if s.strip()]
+            for index, sentence in enumerate(sentences):
+                units.append({"text": sentence, "heading": False, "newline": index == 0})
+            paragraph.clear()
+
+    for line in text.split("\n"):
+        stripped = line.strip()
+        if not stripped:
+            flush()
+        elif stripped.startswith("#"):
+            flush()
+            units.append({"text": stripped, "heading": True, "newline": True})
+        elif LIST_ITEM.match(stripped):
+            flush()
+            units.append({"text": stripped, "heading": False, "newline": True})
+        else:
+            paragraph.append(stripped)
+    flush()
+    return units
+
+def unit_key(text: str) -> str:
+    """Key of a unit's vector, shared by the query-time cache and the index."""
+    return hashlib.md5(text.encode()).hexdigest()
+
+class SnippetCompressor:
+    """
+    Shrinks search results to the sentences and rule blocks most relevant to
+    the query, within a character budget per tool response. Units are scored
+    by cosine similarity against the query embedding the search already
+    computed. Unit vectors are precomputed when the index is built and looked
+    up by key, so queries only embed units the index doesn't have (e.g. an
+    index from an older version); those are cached across calls. With
+    `count_tokens` (the chunker's tokenizer), saved tokens are counted instead
+    of estimated.
+    """
+
+    def __init__(self, embeddings, char_budget: int = 2000, cache_size: int = 4096, count_tokens=None):
+        self.embeddings = embeddings
+        self.char_budget = char_budget
+        self.cache_size = cache_size
+        self.count_tokens = count_tokens or (lambda text: len(text) // CHARS_PER_TOKEN)
+        self.cache = OrderedDict()
+        self.metrics = {
+            "responses": 0, "chars_in": 0, "chars_out": 0, "tokens_in": 0, "tokens_out": 0,
+            "units_precomputed": 0, "units_embedded": 0
+        }
+
+    def _unit_vectors(self, texts: List[str], unit_lookup=None) -> List[List[float]]:
+        """
+        Vectors for unit texts: from the cache, then from `unit_lookup` (keys
+        to precomputed vectors), then one forward pass for the rest.
+        """
+        keys = [unit_key(t) for t in texts]
+        found = {key: self.cache[key] for key in keys if key in self.cache}
+        missing = list(OrderedDict.fromkeys(
+            (key, text) for key, text in zip(keys, texts) if key not in found
+        ))
+        if missing and unit_lookup:
+            precomputed = unit_lookup([key for key, _ in missing])
+            found.update(precomputed)
+            self.metrics["units_precomputed"] += len(precomputed)
+            missing = [(key, text) for key, text in missing if key not in found]
+        if missing:
+            vectors = self.embeddings.embed_documents([text for _, text in missing])
+            found.update((key, vector) for (key, _), vector in zip(missing, vectors))
+            self.metrics["units_embedded"] += len(missing)
+
+        # Build the result before touching the cache, so a batch with more
+        # unique units than cache_size can't evict its own vectors
+        result = [found[key] for key in keys]
+        for key in OrderedDict.fromkeys(keys):
+            self.cache[key] = found[key]
+            self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return result
+
+    def compress_batch(self, query_vectors: List[List[float]], batch_contents: List[List[str]],
+                       unit_lookup=None) -> List[List[str]]:
+        """
+        Compress the result contents of several queries at once. Returns, per
+        query, one snippet per content ("" when nothing from it fits the budget).
+        `unit_lookup` maps unit keys to vectors precomputed by the index.
+        """
+        if not self.char_budget:
+            return batch_contents
+
+        # Split everything first so all missing units are embedded in one pass
+        batch_units = [[split_units(content) for content in contents] for contents in batch_contents]
+        all_texts = [
+            unit["text"]
+            for contents in batch_units for units in contents for unit in units
+            if not unit["heading"]
+        ]
+        vectors = iter(self._unit_vectors(all_texts, unit_lookup)) if all_texts else iter(())
+
+        compressed = []
+        for query_vector, contents, units_per_content in zip(query_vectors, batch_contents, batch_units):
+            scored = []
+            for c_idx, units in enumerate(units_per_content):
+                for u_idx, unit in enumerate(units):
+                    if unit["heading"]:
+                        continue
+                    vector = next(vectors)
+                    score = sum(q * v for q, v in zip(query_vector, vector))
+                    scored.append((score, c_idx, u_idx))
+            compressed.append(self._select(contents, units_per_content, scored))
+        return compressed
+
+    def _select(self, contents, units_per_content, scored):
+        """Greedily keep the highest-scoring units that fit the budget."""
+        chosen = set()
+        used = 0
+        for score, c_idx, u_idx in sorted(scored, reverse=True):
+            length = len(units_per_content[c_idx][u_idx]["text"]) + 1
+            # Always keep the single best unit, even if it alone exceeds the budget
+            if chosen and used + length > self.char_budget:
+                continue
+            chosen.add((c_idx, u_idx))
+            used += length
+
+        snippets = []
+        for c_idx, units in enumerate(units_per_content):
+            kept = [u_idx for u_idx, unit in enumerate(units) if (c_idx, u_idx) in chosen]
+            if not kept:
+                snippets.append("")
+                continue
+
+            # Keep the nearest heading above the first kept unit for context
+            parts = []
+            heading = next((units[i]["text"] for i in range(kept[0], -1, -1) if units[i]["heading"]), None)
+            if heading:
+                parts.append(heading + "\n")
+            previous = None
+            for u_idx in kept:
+                unit = units[u_idx]
+                if previous is not None:
+                    if u_idx != previous + 1:
+                        parts.append("\n…\n")
+                    elif unit["newline"]:
+                        parts.append("\n")
+                    else:
+                        parts.append(" ")
+                parts.append(unit["text"])
+                previous = u_idx
+            snippets.append("".join(parts))
+
+        chars_in = sum(len(c) for c in contents)
+        chars_out = sum(len(s) for s in snippets)
+        tokens_in = sum(self.count_tokens(c) for c in contents)
+        tokens_out = sum(self.count_tokens(s) for s in snippets if s)
+        self.metrics["responses"] += 1
+        self.metrics["chars_in"] += chars_in
+        self.metrics["chars_out"] += chars_out
+        self.metrics["tokens_in"] += tokens_in
+        self.metrics["tokens_out"] += tokens_out
+        print(
+            f"[MCP DEBUG] Compressed results {chars_in} -> {chars_out} chars "
+            f"({tokens_in - tokens_out} tokens saved, "
+            f"{self.metrics['tokens_in'] - self.metrics['tokens_out']} total)",
+            file=sys.stderr
+        )
+        return snippets
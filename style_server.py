@@ -0,0 +1,97 @@
+import os
+import sys
+import time
+import atexit
+import socket
+import threading
+import subprocess
+from typing import Optional
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+SERVER_SCRIPT = os.path.join(current_dir, "redhat_style_server.py")
+
+STYLE_SERVER_HOST = "127.0.0.1"
+# Port of the shared server (0 picks a free one)
+STYLE_SERVER_PORT = int(os.getenv("STYLE_SERVER_PORT", "0"))
+# The first start loads (and may download) the embedding model
+STYLE_SERVER_START_TIMEOUT = float(os.getenv("STYLE_SERVER_START_TIMEOUT", "900"))
+
+class SharedStyleServer:
+    """
+    One MCP style server process shared by every audit in this process,
+    reached over streamable HTTP instead of a private stdio child per audit.
+    Concurrent audits from all Streamlit sessions then go through the same
+    query batcher, embedding model and index.
+    """
+
+    def __init__(self, host: str = STYLE_SERVER_HOST, port: int = STYLE_SERVER_PORT,
+                 start_timeout: float = STYLE_SERVER_START_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.start_timeout = start_timeout
+        self.process: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/mcp"
+
+    def is_running(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def _free_port(self) -> int:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.bind((self.host, 0))
+            return sock.getsockname()[1]
+
+    def _accepts_connections(self) -> bool:
+        try:
+            with socket.create_connection((self.host, self.port), timeout=1):
+                return True
+        except OSError:
+            return False
+
+    def ensure_started(self) -> str:
+        """Start the server unless it is already running and return its URL."""
+        with self._lock:
+            if self.is_running():
+                return self.url
+
+            if not STYLE_SERVER_PORT:
+                self.port = self._free_port()
+            print(f"[AUDIT DEBUG] Starting shared style server on {self.url}", file=sys.stderr)
+            self.process = subprocess.Popen(
+                [sys.executable, SERVER_SCRIPT, "serve", str(self.port)],
+                cwd=current_dir
+            )
+
+            deadline = time.monotonic() + self.start_timeout
+            while not self._accepts_connections():
+                if self.process.poll() is not None:
+                    raise RuntimeError(f"Style server exited with code {self.process.returncode}")
+                if time.monotonic() > deadline:
+                    self.stop()
+                    raise RuntimeError(f"Style server did not start within {self.start_timeout:.0f}s")
+                time.sleep(0.5)
+            return self.url
+
+    def stop(self):
+        if self.is_running():
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
+
+_server = None
+_server_lock = threading.Lock()
+
+def get_style_server() -> SharedStyleServer:
+    """Shared style server for all sessions in this process (started on first use)."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = SharedStyleServer()
+            atexit.register(_server.stop)
+        return _server
@@ -0,0 +1,81 @@
+import itertools
+
+from audit_store import AuditJobStore
+from fingerprint import ChunkFingerprinter
+
+NOTICE = (
+    "This document is provided for informational purposes only. The information is subject to change "
+    "without notice and is not warranted to be error free. Except as expressly set forth in a written "
+    "agreement, the company makes no warranties and disclaims all liability for its use."
+)
+
+# Single-word substitutions at different places in the notice
+EDITS = [("informational", "general"), ("change", "revision"), ("written", "signed")]
+
+def edited(count):
+    text = NOTICE
+    for old, new in EDITS[:count]:
+        text = text.replace(old, new, 1)
+    return text
+
+def paragraph(text):
+    return {"text": text, "type": "paragraph"}
+
+def test_notice_has_realistic_length():
+    assert len(NOTICE.split()) == 45
+
+def test_near_identical_boilerplate_groups_at_default_threshold():
+    fingerprinter = ChunkFingerprinter()
+    for count in (1, 2, 3):
+        chunks = [paragraph(NOTICE), paragraph("An unrelated paragraph about installing the product."), paragraph(edited(count))]
+        duplicates = fingerprinter.group(chunks)
+        assert 2 in duplicates, f"{count} edited word(s) not grouped"
+        rep, similarity = duplicates[2]
+        assert rep == 0
+        assert 0.9 <= similarity < 1.0
+
+def test_every_edit_position_groups():
+    fingerprinter = ChunkFingerprinter()
+    words = NOTICE.split()
+    for index in range(len(words)):
+        variant = " ".join(words[:index] + ["replaced"] + words[index + 1:])
+        matched, _ = fingerprinter.is_near_match(fingerprinter.fingerprint(NOTICE), fingerprinter.fingerprint(variant))
+        assert matched, f"edit at word {index} not matched"
+
+def test_rewritten_paragraph_is_not_grouped():
+    fingerprinter = ChunkFingerprinter()
+    words = NOTICE.split()
+    rewritten = " ".join(words[:16] + ["lorem"] * 13 + words[29:])
+    matched, similarity = fingerprinter.is_near_match(fingerprinter.fingerprint(NOTICE), fingerprinter.fingerprint(rewritten))
+    assert not matched
+    assert similarity < 0.8
+
+def test_exact_only_threshold_ignores_near_duplicates():
+    fingerprinter = ChunkFingerprinter(threshold=1.0)
+    chunks = [paragraph(NOTICE), paragraph(edited(1)), paragraph("  " + NOTICE.upper())]
+    assert fingerprinter.group(chunks) == {2: (0, 1.0)}
+
+def test_short_paragraphs_only_match_exactly():
+    fingerprinter = ChunkFingerprinter()
+    chunks = [paragraph("Red Hat Enterprise Linux"), paragraph("Red Hat Enterprise Linux 9")]
+    assert fingerprinter.group(chunks) == {}
+
+def test_store_finds_near_duplicate_from_previous_job(tmp_path):
+    store = AuditJobStore(str(tmp_path / "jobs.db"))
+    fingerprinter = ChunkFingerprinter()
+    report = {"feedback": "Fine as is.", "proposed_text": NOTICE}
+    store.save_fingerprint_report("model", "guides-v1", "paragraph", fingerprinter.fingerprint(NOTICE), report)
+
+    for count in (1, 2, 3):
+        found = store.find_fingerprint_report("model", "guides-v1", "paragraph", fingerprinter.fingerprint(edited(count)), fingerprinter)
+        assert found is not None
+        assert found[0] == report
+
+def test_store_only_shares_reports_for_same_model_and_guides(tmp_path):
+    store = AuditJobStore(str(tmp_path / "jobs.db"))
+    fingerprinter = ChunkFingerprinter()
+    fingerprint = fingerprinter.fingerprint(NOTICE)
+    store.save_fingerprint_report("model", "guides-v1", "paragraph", fingerprint, {"feedback": "Fine as is."})
+
+    assert store.find_fingerprint_report("other-model", "guides-v1", "paragraph", fingerprint, fingerprinter) is None
+    assert store.find_fingerprint_report("model", "guides-v2", "paragraph", fingerprint, fingerprinter) is None
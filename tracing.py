@@ -0,0 +1,268 @@
+import os
+import sys
+import json
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# When set, the auditor and the MCP server subprocess both write trace
+# events to this directory
+AUDIT_TRACE_DIR_ENV = "AUDIT_TRACE_DIR"
+# When set as well, the MCP server also runs a sampling profiler
+AUDIT_PROFILE_ENV = "AUDIT_PROFILE"
+
+def _now_us() -> float:
+    # Wall-clock microseconds so events from separate processes line up
+    return time.time_ns() / 1000
+
+class Tracer:
+    """
+    Records a timeline as Chrome trace events (viewable in Perfetto or
+    chrome://tracing). Spans are "complete" events with a start and duration;
+    each process writes its own file and the auditor merges them on export.
+    """
+
+    def __init__(self, process_name: str):
+        self.process_name = process_name
+        self.pid = os.getpid()
+        self.events: List[Dict] = []
+        self._open = {}
+        self._flushed = 0
+        self._lock = threading.Lock()
+        self._add({"name": "process_name", "ph": "M", "args": {"name": process_name}})
+
+    def name_lane(self, tid: int, name: str):
+        """Label a synthetic track (tid) in the trace viewer."""
+        self._add({"name": "thread_name", "ph": "M", "tid": tid, "args": {"name": name}})
+
+    def _add(self, event: Dict):
+        event.setdefault("pid", self.pid)
+        event.setdefault("tid", threading.get_native_id())
+        with self._lock:
+            self.events.append(event)
+
+    @contextmanager
+    def span(self, name: str, cat: str = "audit", **args):
+        start = _now_us()
+        try:
+            yield
+        finally:
+            self._add({"name": name, "cat": cat, "ph": "X", "ts": start, "dur": _now_us() - start, "args": args})
+
+    def begin(self, key, name: str, cat: str = "audit", tid: Optional[int] = None, **args):
+        """Start a span that is ended elsewhere (e.g. by a callback)."""
+        with self._lock:
+            self._open[key] = (name, cat, tid, _now_us(), args)
+
+    def end(self, key, **args):
+        with self._lock:
+            opened = self._open.pop(key, None)
+        if opened:
+            name, cat, tid, start, begin_args = opened
+            event = {"name": name, "cat": cat, "ph": "X", "ts": start, "dur": _now_us() - start,
+                     "args": {**begin_args, **args}}
+            if tid is not None:
+                event["tid"] = tid
+            self._add(event)
+
+    def write(self, path: str):
+        with self._lock:
+            events = list(self.events)
+        with open(path, "w") as f:
+            json.dump(events, f)
+
+    def append_new(self, path: str):
+        """Append the events recorded since the last call to `path` as JSON lines."""
+        with self._lock:
+            events = self.events[self._flushed:]
+            self._flushed = len(self.events)
+        if events:
+            with open(path, "a") as f:
+                f.writelines(json.dumps(event) + "\n" for event in events)
+
+def _read_trace_file(path: str) -> List[Dict]:
+    """Events from a JSON list file or a JSON-lines file (.jsonl)."""
+    with open(path, "r") as f:
+        if not path.endswith(".jsonl"):
+            return json.load(f)
+        events = []
+        for line in f:
+            try:
+                events.append(json.loads(line))
+            except json.JSONDecodeError:
+                # A line still being written by a live process
+                continue
+        return events
+
+def merge_traces(output_path: str, trace_files: List[str], events: Optional[List[Dict]] = None):
+    """Merge per-process event files into one Chrome trace JSON file."""
+    merged = list(events or [])
+    for trace_file in trace_files:
+        try:
+            merged.extend(_read_trace_file(trace_file))
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"[TRACE] Skipping unreadable trace file {trace_file}: {e}", file=sys.stderr)
+    with open(output_path, "w") as f:
+        json.dump({"traceEvents": merged, "displayTimeUnit": "ms"}, f)
+
+class SamplingProfiler:
+    """
+    Minimal stdlib sampling profiler: a background thread periodically
+    samples the stacks of the target threads and counts the functions seen.
+    Besides the starting thread, other threads can be sampled while they run
+    a block (`track`). Dumps the hottest functions plus collapsed stacks
+    (flamegraph format).
+    """
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = 0.005):
+        self.thread_ids = {thread_id or threading.get_ident()}
+        self.interval = interval
+        self.self_counts = Counter()
+        self.total_counts = Counter()
+        self.stacks = Counter()
+        self.samples = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @contextmanager
+    def track(self):
+        """Also sample the current thread while the block runs (e.g. worker threads)."""
+        thread_id = threading.get_ident()
+        with self._lock:
+            added = thread_id not in self.thread_ids
+            self.thread_ids.add(thread_id)
+        try:
+            yield
+        finally:
+            if added:
+                with self._lock:
+                    self.thread_ids.discard(thread_id)
+
+    def _add_stack(self, stack: List[str], count: int = 1):
+        """Count one stack, innermost frame first."""
+        self.samples += count
+        self.self_counts[stack[0]] += count
+        for func in set(stack):
+            self.total_counts[func] += count
+        self.stacks[";".join(reversed(stack))] += count
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                thread_ids = list(self.thread_ids)
+            for thread_id in thread_ids:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self._add_stack(stack)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    @classmethod
+    def from_folded(cls, path: str, interval: float = 0.005) -> "SamplingProfiler":
+        """Load the collapsed stacks another process dumped, to merge its profile."""
+        profiler = cls(interval=interval)
+        with open(path, "r") as f:
+            for line in f:
+                stack, _, count = line.rstrip("\n").rpartition(" ")
+                if stack and count.isdigit():
+                    profiler._add_stack(list(reversed(stack.split(";"))), int(count))
+        return profiler
+
+    def dump(self, path: str, top_n: int = 40, process_name: Optional[str] = None, append: bool = False):
+        """
+        Write a hot-function summary to `path` and collapsed stacks next to it.
+        With `append`, adds a section for another process to existing files;
+        its collapsed stacks are rooted at `process_name`.
+        """
+        mode = "a" if append else "w"
+        with open(path, mode) as f:
+            if append:
+                f.write("\n")
+            if process_name:
+                f.write(f"== {process_name} ==\n")
+            f.write(f"{self.samples} samples every {self.interval * 1000:.1f} ms\n\n")
+            f.write(f"{'self %':>7} {'total %':>8}  function\n")
+            for func, count in self.self_counts.most_common(top_n):
+                f.write(f"{count / self.samples * 100 if self.samples else 0:7.1f} "
+                        f"{self.total_counts[func] / self.samples * 100 if self.samples else 0:8.1f}  {func}\n")
+        with open(os.path.splitext(path)[0] + ".folded", mode) as f:
+            root = f"{process_name};" if process_name else ""
+            for stack, count in self.stacks.most_common():
+                f.write(f"{root}{stack} {count}\n")
+
+_tracer = None
+_profiler = None
+
+def get_process_tracer(process_name: str) -> Optional[Tracer]:
+    """Tracer for this process if tracing is enabled via AUDIT_TRACE_DIR, else None."""
+    global _tracer
+    if _tracer is None and os.getenv(AUDIT_TRACE_DIR_ENV):
+        _tracer = Tracer(process_name)
+    return _tracer
+
+def flush_process_tracer():
+    """
+    Append this process's new trace events to its file in AUDIT_TRACE_DIR
+    (no-op when disabled). Only events since the last flush are written.
+    """
+    trace_dir = os.getenv(AUDIT_TRACE_DIR_ENV)
+    if _tracer is None or not trace_dir:
+        return
+    os.makedirs(trace_dir, exist_ok=True)
+    _tracer.append_new(os.path.join(trace_dir, f"{_tracer.process_name}-{_tracer.pid}.jsonl"))
+
+def get_process_profiler() -> Optional[SamplingProfiler]:
+    """
+    Sampling profiler for this process if tracing and AUDIT_PROFILE are both
+    set, else None. Started on the first call, sampling the calling thread.
+    """
+    global _profiler
+    if _profiler is None and os.getenv(AUDIT_TRACE_DIR_ENV) and os.getenv(AUDIT_PROFILE_ENV):
+        _profiler = SamplingProfiler()
+        _profiler.start()
+    return _profiler
+
+def close_process_tracing():
+    """Flush the remaining trace events and write the profile (call at shutdown)."""
+    flush_process_tracer()
+    trace_dir = os.getenv(AUDIT_TRACE_DIR_ENV)
+    if _profiler is None or not trace_dir:
+        return
+    _profiler.stop()
+    name = _tracer.process_name if _tracer else "process"
+    _profiler.dump(os.path.join(trace_dir, f"{name}-{os.getpid()}.profile.txt"))
+
+@contextmanager
+def maybe_track(profiler: Optional[SamplingProfiler]):
+    """Sample the current thread during the block; no-op when profiling is disabled."""
+    if profiler is None:
+        yield
+    else:
+        with profiler.track():
+            yield
+
+@contextmanager
+def maybe_span(tracer: Optional[Tracer], name: str, cat: str = "audit", **args):
+    """Span that is a no-op when tracing is disabled."""
+    if tracer is None:
+        yield
+    else:
+        with tracer.span(name, cat, **args):
+            yield
@@ -0,0 +1,203 @@
+import os
+import sys
+import json
+import time
+import shutil
+from typing import Dict, List, Optional
+from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
+from snippet_compressor import unit_key
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+# Shared by the MCP server (builds, searches) and the app (stats, compaction)
+VECTOR_DB_DIR = os.path.join(current_dir, ".vector_db")
+
+CURRENT_POINTER = "CURRENT"
+GENERATION_PREFIX = "gen-"
+GENERATION_META = "generation.json"
+# Vectors of guide units (sentences, list items), used to score snippets
+UNIT_COLLECTION = "guide_units"
+UNIT_BATCH_SIZE = 4096
+# Bump when generations store new data, so older ones are rebuilt
+INDEX_LAYOUT_VERSION = 2
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+class VectorIndexManager:
+    """
+    Manages the guide index as versioned generations under one root directory.
+
+    Each rebuild is written to a fresh generation directory next to the live
+    one. Only once it is complete does the CURRENT pointer get swapped
+    (atomically, via os.replace), so searches never see a half-built index.
+    Generations older than the current one are garbage-collected.
+    """
+
+    def __init__(self, root_dir: str, embeddings, keep_previous: int = 1):
+        self.root_dir = root_dir
+        self.embeddings = embeddings
+        # Previous generations kept around for other processes still reading them
+        self.keep_previous = keep_previous
+        os.makedirs(root_dir, exist_ok=True)
+
+    def _generation_path(self, generation: str) -> str:
+        return os.path.join(self.root_dir, generation)
+
+    def list_generations(self) -> List[str]:
+        """Complete generations, oldest first."""
+        generations = [
+            name for name in os.listdir(self.root_dir)
+            if name.startswith(GENERATION_PREFIX)
+            and os.path.exists(os.path.join(self.root_dir, name, GENERATION_META))
+        ]
+        return sorted(generations)
+
+    def current_generation(self) -> Optional[str]:
+        pointer = os.path.join(self.root_dir, CURRENT_POINTER)
+        if not os.path.exists(pointer):
+            return None
+        with open(pointer, "r") as f:
+            generation = f.read().strip()
+        if not os.path.exists(os.path.join(self._generation_path(generation), GENERATION_META)):
+            return None
+        return generation
+
+    def read_meta(self, generation: str) -> Dict:
+        with open(os.path.join(self._generation_path(generation), GENERATION_META), "r") as f:
+            return json.load(f)
+
+    def open_current(self, content_hash: str) -> Optional[Chroma]:
+        """Open the live generation if it was built from the same guide content."""
+        generation = self.current_generation()
+        if generation is None or self.read_meta(generation).get("content_hash") != content_hash:
+            return None
+        print(f"[MCP DEBUG] Reusing index generation {generation}", file=sys.stderr)
+        return Chroma(
+            persist_directory=self._generation_path(generation),
+            embedding_function=self.embeddings
+        )
+
+    def build(self, documents: List[Document], content_hash: str, unit_texts: Optional[List[str]] = None) -> Chroma:
+        """
+        Build a new generation off to the side, swap it in, and collect old
+        ones. `unit_texts` are embedded once here and stored with the
+        generation, so queries can look their vectors up.
+        """
+        generation = f"{GENERATION_PREFIX}{time.time_ns()}"
+        path = self._generation_path(generation)
+        print(f"[MCP DEBUG] Building index generation {generation} ({len(documents)} chunks)", file=sys.stderr)
+
+        store = Chroma.from_documents(
+            documents=documents,
+            embedding=self.embeddings,
+            persist_directory=path
+        )
+        if unit_texts:
+            self._add_unit_vectors(store, unit_texts)
+
+        # The metadata file marks the generation as complete
+        with open(os.path.join(path, GENERATION_META), "w") as f:
+            json.dump({
+                "content_hash": content_hash,
+                "chunk_count": len(documents),
+                "created_at": time.time()
+            }, f)
+
+        # Atomic swap of the CURRENT pointer
+        pointer_tmp = os.path.join(self.root_dir, f"{CURRENT_POINTER}.{os.getpid()}.tmp")
+        with open(pointer_tmp, "w") as f:
+            f.write(generation)
+        os.replace(pointer_tmp, os.path.join(self.root_dir, CURRENT_POINTER))
+
+        self.gc()
+        return store
+
+    def _add_unit_vectors(self, store: Chroma, unit_texts: List[str]):
+        texts = list(dict.fromkeys(unit_texts))
+        print(f"[MCP DEBUG] Embedding {len(texts)} guide units", file=sys.stderr)
+        vectors = self.embeddings.embed_documents(texts)
+        collection = store._client.get_or_create_collection(UNIT_COLLECTION, embedding_function=None)
+        ids = [unit_key(text) for text in texts]
+        for start in range(0, len(ids), UNIT_BATCH_SIZE):
+            collection.add(
+                ids=ids[start:start + UNIT_BATCH_SIZE],
+                embeddings=vectors[start:start + UNIT_BATCH_SIZE]
+            )
+
+    @staticmethod
+    def unit_vectors(store: Chroma, keys: List[str]) -> Dict[str, List[float]]:
+        """Precomputed unit vectors by key; generations built without them return {}."""
+        try:
+            collection = store._client.get_collection(UNIT_COLLECTION, embedding_function=None)
+        except Exception:
+            return {}
+        result = collection.get(ids=keys, include=["embeddings"])
+        return dict(zip(result["ids"], result["embeddings"]))
+
+    def gc(self, keep_previous: Optional[int] = None) -> List[str]:
+        """
+        Remove generations older than the current one, keeping the newest
+        `keep_previous` of them. Newer generations may still be under
+        construction by another process and are left alone.
+        """
+        if keep_previous is None:
+            keep_previous = self.keep_previous
+        current = self.current_generation()
+        if current is None:
+            return []
+
+        candidates = sorted(
+            name for name in os.listdir(self.root_dir)
+            if name.startswith(GENERATION_PREFIX) and name < current
+        )
+        stale = candidates[:len(candidates) - keep_previous] if keep_previous else candidates
+        for generation in stale:
+            shutil.rmtree(self._generation_path(generation), ignore_errors=True)
+            print(f"[MCP DEBUG] Removed old index generation {generation}", file=sys.stderr)
+        return stale
+
+    def compact(self, keep_previous: Optional[int] = None) -> List[str]:
+        """
+        Collect old generations (keeping `keep_previous`, by default the same
+        number gc keeps for readers in other processes) and remove files left
+        over from the old single-directory index layout.
+        """
+        removed = self.gc(keep_previous=keep_previous)
+        current = self.current_generation()
+        if current is None:
+            return removed
+
+        for name in os.listdir(self.root_dir):
+            if name in (current, CURRENT_POINTER) or name.startswith(GENERATION_PREFIX):
+                continue
+            # Another process is about to swap the pointer with this file
+            if name.startswith(f"{CURRENT_POINTER}.") and name.endswith(".tmp"):
+                continue
+            path = os.path.join(self.root_dir, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+            removed.append(name)
+        return removed
+
+    def stats(self) -> Dict:
+        """Index size and chunk-count statistics."""
+        current = self.current_generation()
+        meta = self.read_meta(current) if current else {}
+        return {
+            "generation": current,
+            "chunk_count": meta.get("chunk_count", 0),
+            "built_at": meta.get("created_at"),
+            "index_bytes": _dir_size(self._generation_path(current)) if current else 0,
+            "total_bytes": _dir_size(self.root_dir),
+            "generations": len(self.list_generations())
+        }